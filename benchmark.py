@@ -0,0 +1,195 @@
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+from os.path import isdir, join
+
+import dados
+
+from conta_dentes import Avaliador
+from dados import (
+    carrega_dados,
+    contagens_regra,
+    contagens_unidades,
+    metricas_unidades,
+)
+from metricas_por_dentes import Avaliador as AvaliadorPorDente
+from monte_carlo import soma_amostras_paralelo
+from pareamento import IndicePares
+from sintetico import MODELOS_SINTETICOS, gera_dataset
+
+TAMANHOS = (1000, 10000, 100000)
+DATASETS_DIR = ".cache_benchmark/"
+RESULTADOS = "resultados_benchmark.jsonl"
+# Etapa mais lenta que a última execução registrada além desta proporção
+TOLERANCIA = 0.2
+# Diferenças menores que isto (segundos) são ruído de medição
+DIFERENCA_MINIMA = 0.01
+
+
+def dataset(n_imagens, datasets_dir=DATASETS_DIR):
+    # Dataset sintético de n_imagens, gerado uma vez e reaproveitado
+    destino = join(datasets_dir, str(n_imagens))
+    caminhos = {"anotacao": join(destino, "anotacao")}
+    caminhos.update(
+        {
+            modelo: join(destino, pasta)
+            for modelo, (pasta, _) in MODELOS_SINTETICOS.items()
+        }
+    )
+    if not all(
+        isdir(caminho) and len(os.listdir(caminho)) == n_imagens
+        for caminho in caminhos.values()
+    ):
+        caminhos = gera_dataset(destino, n_imagens)
+    return caminhos
+
+
+def limpa_memos():
+    # Sem os dados já lidos neste processo, cada leitura parte do zero
+    dados._pastas.clear()
+    dados._indices.clear()
+    dados._carregados.clear()
+
+
+def etapas(caminhos, modelo="old", num_iteracoes=1000, amostra_tamanho=0.7):
+    # Etapas medidas, na ordem: nome -> função sem argumentos. As funções de
+    # cada etapa usam os resultados das anteriores.
+    anotacao_path = caminhos["anotacao"]
+    model_path = caminhos[modelo]
+    estado = {}
+
+    def listagem():
+        IndicePares(anotacao_path, model_path).atualiza()
+
+    def leitura():
+        limpa_memos()
+        estado["dados"] = carrega_dados(anotacao_path, model_path, cache_dir=None)
+
+    def score():
+        estado["contagens"] = contagens_regra(estado["dados"], modelo)
+        avaliador = Avaliador()
+        avaliador.acumula(estado["contagens"], len(estado["dados"]))
+        avaliador.calcula_metricas()
+
+    def por_dente():
+        avaliador = AvaliadorPorDente()
+        avaliador.acumula(estado["contagens"])
+        avaliador.calcula_metricas()
+
+    def monte_carlo():
+        contagens = contagens_unidades(estado["contagens"]["por_imagem"])
+        totais = soma_amostras_paralelo(
+            contagens, int(len(contagens) * amostra_tamanho), num_iteracoes, seed=0
+        )
+        metricas_unidades(totais)
+
+    return {
+        "listagem": listagem,
+        "leitura": leitura,
+        "score": score,
+        "por_dente": por_dente,
+        "monte_carlo": monte_carlo,
+    }
+
+
+def mede(funcao, repeticoes=3):
+    # Menor tempo entre as repetições e pico de memória alocada (MB) em uma
+    # execução extra com tracemalloc, que não entra na medição do tempo
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    tracemalloc.start()
+    try:
+        funcao()
+        pico = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return min(tempos), pico / 2**20
+
+
+def executa(tamanhos=TAMANHOS, modelo="old", repeticoes=3):
+    data = time.strftime("%Y-%m-%dT%H:%M:%S")
+    leitor = next(
+        nome for nome, f in dados.LEITORES_JSON.items() if f is dados.leitor_json
+    )
+    resultados = []
+    for n_imagens in tamanhos:
+        caminhos = dataset(n_imagens)
+        for etapa, funcao in etapas(caminhos, modelo).items():
+            segundos, pico_mb = mede(funcao, repeticoes)
+            resultados.append(
+                {
+                    "data": data,
+                    "imagens": n_imagens,
+                    "modelo": modelo,
+                    "etapa": etapa,
+                    "segundos": segundos,
+                    "imagens_por_segundo": n_imagens / segundos,
+                    "pico_mb": pico_mb,
+                    "leitor_json": leitor,
+                    "python": platform.python_version(),
+                    "numpy": np.__version__,
+                }
+            )
+            print(
+                f"{n_imagens:>7} imagens  {etapa:<12}: {segundos:8.3f}s "
+                f"({n_imagens / segundos:12.0f} imagens/s, pico {pico_mb:8.1f} MB)"
+            )
+        limpa_memos()
+    return resultados
+
+
+def le_resultados(path=RESULTADOS):
+    if not os.path.isfile(path):
+        return []
+    with open(path) as file:
+        return [json.loads(linha) for linha in file if linha.strip()]
+
+
+def salva_resultados(resultados, path=RESULTADOS):
+    # Uma linha JSON por (tamanho, etapa); execuções anteriores são mantidas
+    with open(path, "a") as file:
+        for resultado in resultados:
+            file.write(json.dumps(resultado) + "\n")
+
+
+def regressoes(resultados, anteriores, tolerancia=TOLERANCIA):
+    # Etapas mais lentas que a última medição registrada do mesmo tamanho e modelo
+    ultimos = {}
+    for anterior in anteriores:
+        ultimos[(anterior["imagens"], anterior["modelo"], anterior["etapa"])] = anterior
+    lentas = []
+    for resultado in resultados:
+        anterior = ultimos.get(
+            (resultado["imagens"], resultado["modelo"], resultado["etapa"])
+        )
+        if (
+            anterior
+            and resultado["segundos"] > anterior["segundos"] * (1 + tolerancia)
+            and resultado["segundos"] - anterior["segundos"] > DIFERENCA_MINIMA
+        ):
+            lentas.append((resultado, anterior))
+    return lentas
+
+
+if __name__ == "__main__":
+    # python benchmark.py [tamanho ...]
+    tamanhos = [int(n) for n in sys.argv[1:]] or TAMANHOS
+    anteriores = le_resultados()
+    resultados = executa(tamanhos)
+    salva_resultados(resultados)
+    lentas = regressoes(resultados, anteriores)
+    for resultado, anterior in lentas:
+        print(
+            f"AVISO: {resultado['etapa']} com {resultado['imagens']} imagens "
+            f"levou {resultado['segundos']:.3f}s (antes {anterior['segundos']:.3f}s "
+            f"em {anterior['data']})"
+        )
+    sys.exit(1 if lentas else 0)
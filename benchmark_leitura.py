@@ -0,0 +1,90 @@
+import json
+import tempfile
+import time
+
+from os.path import join
+
+import dados
+
+from dados import LEITORES_JSON, carrega_pasta, define_leitor_json, linha_saida
+from pacotes import empacota_pasta
+from pareamento import lista_pasta
+from pipeline import leitor_pipeline
+
+# Latência simulada por arquivo, como em um armazenamento em rede
+LATENCIA = 0.002
+
+
+def leitura_original(path):
+    # Caminho anterior: json.loads(file.read()) e um dicionário Python completo
+    # por arquivo, depois convertido para arrays
+    for nome in lista_pasta(path)[0]:
+        with open(join(path, nome), "r") as file:
+            linha_saida(json.loads(file.read()))
+
+
+def leitura_backend(path, nome):
+    define_leitor_json(nome)
+    dados._pastas.clear()
+    carrega_pasta(path, "saida", cache_dir=None)
+
+
+def leitura_pipeline(path, leitor):
+    dados._pastas.clear()
+    carrega_pasta(path, "saida", cache_dir=None, leitor=leitor)
+
+
+def cronometra(funcao, *args, repeticoes=3):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao(*args)
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos)
+
+
+if __name__ == "__main__":
+    print("Leitores de JSON")
+    for path in ("test/output_longaxis_old/", "test/output_longaxis_standard/"):
+        n = len(lista_pasta(path)[0])
+        base = cronometra(leitura_original, path)
+        print(f"{path} ({n} arquivos)")
+        print(f"  json.loads(file.read()): {base:.3f}s ({n / base:.0f} arquivos/s)")
+        for nome in LEITORES_JSON:
+            tempo = cronometra(leitura_backend, path, nome)
+            print(
+                f"  {nome:<23}: {tempo:.3f}s ({n / tempo:.0f} arquivos/s, "
+                f"{base / tempo:.2f}x)"
+            )
+
+    path = "test/output_longaxis_standard/"
+    n = len(lista_pasta(path)[0])
+    print(f"Pipeline com latência simulada de {LATENCIA * 1000:.0f} ms por arquivo")
+    serial = cronometra(
+        leitura_pipeline,
+        path,
+        leitor_pipeline(1, 0, 1, latencia=LATENCIA),
+        repeticoes=1,
+    )
+    print(f"  sequencial: {serial:.3f}s ({n / serial:.0f} arquivos/s)")
+    for leitores, processos in ((4, 0), (16, 0), (16, 2), (64, 0)):
+        leitor = leitor_pipeline(
+            leitores, processos, em_voo=4 * leitores, latencia=LATENCIA
+        )
+        tempo = cronometra(leitura_pipeline, path, leitor, repeticoes=1)
+        print(
+            f"  {leitores} threads, {processos} processos: {tempo:.3f}s "
+            f"({n / tempo:.0f} arquivos/s, {serial / tempo:.2f}x)"
+        )
+
+    print("Pasta empacotada (JSONL + índice, lida por mmap)")
+    with tempfile.TemporaryDirectory() as destino:
+        empacota_pasta(path, destino)
+        soltos = cronometra(leitura_pipeline, path, None)
+        empacotado = cronometra(leitura_pipeline, destino, None)
+        print(f"  arquivos soltos: {soltos:.3f}s ({n / soltos:.0f} arquivos/s)")
+        print(
+            f"  empacotada     : {empacotado:.3f}s ({n / empacotado:.0f} arquivos/s, "
+            f"{soltos / empacotado:.2f}x; {serial / empacotado:.2f}x em relação aos "
+            f"arquivos soltos com {LATENCIA * 1000:.0f} ms de latência por arquivo)"
+        )
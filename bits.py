@@ -0,0 +1,42 @@
+import numpy as np
+
+# São exatamente 32 dentes: o bit i de cada uint32 corresponde a DENTES[i]
+# (11, 12, ..., 48), e a máscara de uma imagem cabe em uma palavra
+N_BITS = 32
+PESOS_BITS = np.uint32(1) << np.arange(N_BITS, dtype=np.uint32)
+
+
+def empacota(mascara):
+    # (..., 32) bool -> (...) uint32
+    mascara = np.asarray(mascara, dtype=bool)
+    bytes_ = np.packbits(mascara, axis=-1, bitorder="little")
+    return np.ascontiguousarray(bytes_).view("<u4")[..., 0].astype(np.uint32)
+
+
+def desempacota(bits):
+    # (...) uint32 -> (..., 32) bool
+    bits = np.asarray(bits)
+    bytes_ = np.ascontiguousarray(bits, dtype="<u4").view(np.uint8)
+    bytes_ = bytes_.reshape(*bits.shape, 4)
+    return np.unpackbits(bytes_, axis=-1, bitorder="little").astype(bool)
+
+
+if hasattr(np, "bitwise_count"):
+
+    def popcount(bits):
+        return np.bitwise_count(bits)
+
+else:
+    # Tabela de 16 bits para versões do NumPy sem bitwise_count
+    _TABELA = np.array([bin(i).count("1") for i in range(1 << 16)], dtype=np.uint8)
+
+    def popcount(bits):
+        return _TABELA[bits & 0xFFFF] + _TABELA[bits >> 16]
+
+
+def contagens_por_dente_bits(bits):
+    # (..., n) uint32 -> (..., 32) int64: quantas das n palavras têm cada bit
+    # ligado (fatiamento por bit, sem desempacotar)
+    return np.stack(
+        [np.count_nonzero(bits & peso, axis=-1) for peso in PESOS_BITS], axis=-1
+    ).astype(np.int64)
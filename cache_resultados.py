@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+import zipfile
+import numpy as np
+
+from os.path import join
+
+from dados import CACHE_DIR, indice_pares
+
+CACHE_RESULTADOS = ".cache_resultados/"
+# Tamanho máximo do cache em disco; acima disso os resultados usados há mais
+# tempo são apagados
+TAMANHO_MAXIMO = 256 * 2**20
+VERSAO_RESULTADOS = 1
+
+
+def impressao_digital(anotacao_path, model_path, cache_dir=CACHE_DIR):
+    # Hash das listagens (nomes, tamanhos e mtimes) das duas pastas: muda se
+    # qualquer arquivo for adicionado, removido ou alterado
+    indice = indice_pares(anotacao_path, model_path, cache_dir)
+    soma = hashlib.sha1()
+    for path in (anotacao_path, model_path):
+        soma.update(os.path.abspath(path).encode() + b"\0")
+    for listagem in (indice.listagem_an, indice.listagem_ot):
+        for array in listagem:
+            soma.update(np.ascontiguousarray(array).tobytes())
+    return soma.hexdigest()
+
+
+def chave_resultado(tipo, anotacao_path, model_path, **parametros):
+    parametros = json.dumps(
+        {"tipo": tipo, "versao": VERSAO_RESULTADOS, **parametros},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha1(
+        (impressao_digital(anotacao_path, model_path) + parametros).encode()
+    ).hexdigest()
+
+
+def le_resultado(chave, cache_dir=CACHE_RESULTADOS):
+    path = join(cache_dir, f"{chave}.npz")
+    try:
+        with np.load(path) as arquivo:
+            resultado = {nome: arquivo[nome] for nome in arquivo.files}
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, EOFError, zipfile.BadZipFile):
+        # Entrada corrompida: apagada para ser calculada e gravada de novo
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return None
+    # O mtime marca o último uso, para a remoção dos menos usados
+    os.utime(path)
+    return resultado
+
+
+def salva_resultado(chave, resultado, cache_dir=CACHE_RESULTADOS):
+    os.makedirs(cache_dir, exist_ok=True)
+    path = join(cache_dir, f"{chave}.npz")
+    with open(path + ".tmp", "wb") as file:
+        np.savez(file, **resultado)
+    os.replace(path + ".tmp", path)
+
+
+def remove_antigos(cache_dir=CACHE_RESULTADOS, tamanho_maximo=TAMANHO_MAXIMO):
+    # Apaga os resultados usados há mais tempo até o cache caber no limite
+    if not os.path.isdir(cache_dir):
+        return
+    entradas = []
+    with os.scandir(cache_dir) as arquivos:
+        for arquivo in arquivos:
+            if arquivo.name.endswith(".npz"):
+                st = arquivo.stat()
+                entradas.append((st.st_mtime_ns, st.st_size, arquivo.path))
+    entradas.sort()
+    tamanho = sum(e[1] for e in entradas)
+    for _, tamanho_arquivo, path in entradas:
+        if tamanho <= tamanho_maximo:
+            break
+        os.remove(path)
+        tamanho -= tamanho_arquivo
+
+
+def memoriza(
+    tipo,
+    anotacao_path,
+    model_path,
+    calcula,
+    cache_dir=CACHE_RESULTADOS,
+    tamanho_maximo=TAMANHO_MAXIMO,
+    **parametros,
+):
+    # Resultado de calcula() ({nome: array}) para este par de pastas e estes
+    # parâmetros, lido do disco se já foi calculado com os mesmos arquivos
+    chave = chave_resultado(tipo, anotacao_path, model_path, **parametros)
+    resultado = le_resultado(chave, cache_dir)
+    if resultado is None:
+        resultado = {nome: np.asarray(valor) for nome, valor in calcula().items()}
+        salva_resultado(chave, resultado, cache_dir)
+        remove_antigos(cache_dir, tamanho_maximo)
+    return resultado
@@ -0,0 +1,163 @@
+import numpy as np
+import matplotlib.pyplot as plt
+
+from dados import DENTES
+from monte_carlo import intervalos_confianca, soma_amostras_paralelo
+
+# Faixas de score (0 a 1) da curva de confiabilidade
+FAIXAS_CALIBRACAO = 10
+METRICAS_CALIBRACAO = ["ece", "mce", "brier"]
+
+
+def somas_calibracao(dados, faixas=FAIXAS_CALIBRACAO, por_imagem=False, por_dente=True):
+    # Somas de cada faixa de score em uma única passada de bincount:
+    # (..., faixas, 4) com quantidade de scores, soma dos scores, dentes presentes
+    # na anotação e soma de (score - anotação)**2. Dimensões iniciais: imagem
+    # (por_imagem) e dente (por_dente). Dentes sem score (nan) ficam de fora.
+    validos = np.flatnonzero(~np.isnan(dados.score.ravel()))
+    score = dados.score.ravel()[validos].astype(np.float64)
+    anotacao = dados.anotacao.ravel()[validos].astype(np.float64)
+    faixa = np.clip((score * faixas).astype(np.int64), 0, faixas - 1)
+
+    forma = [faixas]
+    grupo = faixa
+    if por_dente:
+        grupo = grupo + (validos % len(DENTES)) * faixas
+        forma.insert(0, len(DENTES))
+    if por_imagem:
+        grupo = grupo + (validos // len(DENTES)) * int(np.prod(forma))
+        forma.insert(0, len(dados))
+
+    n_grupos = int(np.prod(forma))
+    somas = [
+        np.bincount(grupo, weights=pesos, minlength=n_grupos)
+        for pesos in (None, score, anotacao, (score - anotacao) ** 2)
+    ]
+    return np.stack(somas, axis=-1).reshape(*forma, 4)
+
+
+def metricas_calibracao(somas):
+    # Curva de confiabilidade, ECE, MCE e Brier a partir de somas (..., faixas, 4);
+    # funciona com qualquer número de dimensões iniciais (dentes, iterações)
+    quantidade, soma_scores, positivos, soma_quadrados = np.moveaxis(somas, -1, 0)
+    total = quantidade.sum(axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        confianca = soma_scores / quantidade  # Score médio da faixa
+        frequencia = positivos / quantidade  # Fração presente na anotação
+        lacuna = np.abs(confianca - frequencia)
+        ece = (quantidade * np.nan_to_num(lacuna)).sum(axis=-1) / total
+        mce = np.where(quantidade > 0, lacuna, -np.inf).max(axis=-1)
+        brier = soma_quadrados.sum(axis=-1) / total
+    return {
+        "quantidade": quantidade,
+        "confianca": confianca,
+        "frequencia": frequencia,
+        "ece": ece,
+        "mce": np.where(total > 0, mce, np.nan),
+        "brier": brier,
+    }
+
+
+def calibracao(dados, faixas=FAIXAS_CALIBRACAO):
+    # Calibração do score do modelo, geral e por dente (32, faixas)
+    somas = somas_calibracao(dados, faixas)
+    return {
+        "geral": metricas_calibracao(somas.sum(axis=0)),
+        "por_dente": metricas_calibracao(somas),
+    }
+
+
+def monte_carlo_calibracao(
+    dados,
+    num_iteracoes=1000,
+    amostra_tamanho=0.7,
+    seed=None,
+    processos=1,
+    faixas=FAIXAS_CALIBRACAO,
+    por_dente=False,
+    nivel=0.95,
+    bootstrap=False,
+):
+    # Distribuições e intervalos de ECE, MCE, Brier e da curva de confiabilidade.
+    # As amostras de imagens são as de MonteCarloAvaliador.monte_carlo com a
+    # mesma semente e proporção (subamostras sem reposição, que variam menos
+    # que o conjunto completo). bootstrap=True sorteia n imagens com reposição,
+    # para intervalos das métricas no conjunto completo. por_dente guarda
+    # (n, 32, faixas, 4) somas por imagem em memória; sem ele, (n, faixas, 4).
+    somas = somas_calibracao(dados, faixas, por_imagem=True, por_dente=por_dente)
+    if bootstrap:
+        sample_size = len(dados)
+    else:
+        sample_size = int(len(dados) * amostra_tamanho)
+    totais = soma_amostras_paralelo(
+        somas, sample_size, num_iteracoes, seed, processos, reposicao=bootstrap
+    )
+    metricas = metricas_calibracao(totais)
+
+    distribuicoes = {
+        nome: metricas[nome] for nome in METRICAS_CALIBRACAO + ["frequencia"]
+    }
+    return {
+        "distribuicoes": distribuicoes,
+        "intervalos": {
+            nome: intervalos_confianca(valores, nivel)
+            for nome, valores in distribuicoes.items()
+        },
+    }
+
+
+def mostra_calibracao(resultado):
+    geral = resultado["geral"]
+    print(
+        f"ECE: {geral['ece']:.4f}  MCE: {geral['mce']:.4f}  Brier: {geral['brier']:.4f}"
+    )
+    for dente, ece, mce, brier in zip(
+        DENTES,
+        resultado["por_dente"]["ece"],
+        resultado["por_dente"]["mce"],
+        resultado["por_dente"]["brier"],
+    ):
+        print(f"Dente {dente}: ECE {ece:.4f}  MCE {mce:.4f}  Brier {brier:.4f}")
+
+
+def visualiza_calibracao(resultado, titulo, intervalos=None):
+    # Curva de confiabilidade geral e ECE/Brier por dente; intervalos é o
+    # resultado de monte_carlo_calibracao(..., por_dente=False)["intervalos"]
+    geral = resultado["geral"]
+    por_dente = resultado["por_dente"]
+    fig, axs = plt.subplots(1, 2, figsize=(16, 6))
+
+    preenchidas = geral["quantidade"] > 0
+    yerr = None
+    if intervalos is not None:
+        frequencia = geral["frequencia"][preenchidas]
+        limites = intervalos["frequencia"][:, preenchidas]
+        yerr = np.nan_to_num(
+            np.clip([frequencia - limites[0], limites[1] - frequencia], 0, None)
+        )
+    axs[0].plot([0, 1], [0, 1], "--", color="gray", label="Calibração perfeita")
+    axs[0].errorbar(
+        geral["confianca"][preenchidas],
+        geral["frequencia"][preenchidas],
+        yerr=yerr,
+        marker="o",
+        capsize=3,
+        label=f"Modelo (ECE {geral['ece']:.3f})",
+    )
+    axs[0].set_xlabel("Score médio da faixa")
+    axs[0].set_ylabel("Fração presente na anotação")
+    axs[0].set_title(f"Curva de confiabilidade - {titulo}")
+    axs[0].legend()
+
+    x = np.arange(len(DENTES))
+    width = 0.4
+    axs[1].bar(x - width / 2, por_dente["ece"], width, label="ECE")
+    axs[1].bar(x + width / 2, por_dente["brier"], width, label="Brier")
+    axs[1].set_ylabel("Valor")
+    axs[1].set_title(f"Calibração por dente - {titulo}")
+    axs[1].set_xticks(x)
+    axs[1].set_xticklabels(DENTES, rotation=90)
+    axs[1].legend()
+
+    plt.tight_layout()
+    plt.show()
@@ -0,0 +1,52 @@
+import numpy as np
+
+import perfil
+
+from dados import contagens_regra, contagens_unidades, metricas_unidades
+
+
+def clinica_do_arquivo(nome):
+    # Hostname que antecede os dois últimos campos numéricos do nome do arquivo
+    return nome.rsplit("_", 2)[0]
+
+
+def clinicas(nomes):
+    # Clínicas distintas (ordenadas) e o índice da clínica de cada imagem
+    rotulos, ids = np.unique(
+        np.array([clinica_do_arquivo(nome) for nome in nomes], dtype=str),
+        return_inverse=True,
+    )
+    return rotulos, ids
+
+
+def contagens_por_clinica(dados, modelo="old"):
+    # (n_clinicas, 5): acertos, verdadeiros positivos, falsos positivos,
+    # falsos negativos e número de imagens de cada clínica
+    rotulos, ids = clinicas(dados.nomes)
+    por_imagem = contagens_regra(dados, modelo)["por_imagem"]
+    return rotulos, contagens_unidades(por_imagem, ids, len(rotulos))
+
+
+def metricas_por_clinica(dados, modelo="old"):
+    with perfil.etapa("agregacao"):
+        rotulos, contagens = contagens_por_clinica(dados, modelo)
+    acertos, vp, fp, fn, imagens = contagens.T
+    metricas = metricas_unidades(contagens)
+    return {
+        clinica: {
+            "imagens": int(imagens[i]),
+            "acertos": int(acertos[i]),
+            "verdadeiros_positivos": int(vp[i]),
+            "falsos_positivos": int(fp[i]),
+            "falsos_negativos": int(fn[i]),
+            **{nome: float(valores[i]) for nome, valores in metricas.items()},
+        }
+        for i, clinica in enumerate(rotulos)
+    }
+
+
+def mostra_metricas_por_clinica(metricas):
+    for clinica, valores in metricas.items():
+        print(
+            f"{clinica} ({valores['imagens']} imagens): Erro: {valores['erro']:.2f}, Acurácia: {valores['acuracia']:.2f}, Precisão: {valores['precisao']:.2f}, Recall: {valores['recall']:.2f}, F1-Score: {valores['f1_score']:.2f}"
+        )
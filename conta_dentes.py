@@ -1,9 +1,19 @@
-import json
 import numpy as np
 import matplotlib.pyplot as plt
 
-from os import listdir
-from os.path import isfile, join, splitext
+import perfil
+
+from dados import (
+    LIMIAR_SCORE,
+    METRICAS,
+    carrega_dados,
+    contagens_regra,
+    gera_dentes,
+    obtem_dados,
+)
+from erros import indice_erros
+from limiares import melhor_ponto, varredura_limiares
+from metricas_por_dentes import Avaliador as AvaliadorPorDente
 
 
 class Avaliador:
@@ -17,38 +27,11 @@ class Avaliador:
         self.falsos_negativos = 0
         self.total_dentes = 0
         self.dentes = gera_dentes()
+        # Índice dos falsos positivos/negativos da última avaliação (erros.py)
+        self.erros = None
 
     def obtem_dados(self, model_path):
-        # Listar e ordenar arquivos das duas pastas
-        files_folder_output = sorted(
-            [f for f in listdir(model_path) if isfile(join(model_path, f))]
-        )
-        files_folder_anotacao = sorted(
-            [
-                f
-                for f in listdir(self.anotacao_path)
-                if isfile(join(self.anotacao_path, f))
-            ]
-        )
-
-        # Obter conjunto de nomes base (sem extensão) para comparação
-        base_output = {splitext(f)[0] for f in files_folder_output}
-        base_anotacao = {splitext(f)[0] for f in files_folder_anotacao}
-
-        # Manter apenas arquivos com nomes base comuns
-        common_bases = base_output & base_anotacao  # Interseção dos conjuntos
-        uncommon_bases = (base_output - base_anotacao) | (base_anotacao - base_output)
-
-
-        # Filtrar listas originais para manter apenas arquivos correspondentes
-        files_folder_output = [
-            f for f in files_folder_output if splitext(f)[0] in common_bases
-        ]
-        files_folder_anotacao = [
-            f for f in files_folder_anotacao if splitext(f)[0] in common_bases
-        ]
-
-        return files_folder_anotacao, files_folder_output
+        return obtem_dados(self.anotacao_path, model_path)
 
     def calcula_metricas(self):
         # Cálculo do erro: Proporção de exemplos classificados incorretamente
@@ -87,92 +70,73 @@ class Avaliador:
         )
         print(f"F1-Score: {f1_score} (Média harmônica de precisão e recall)")
 
+    def acumula(self, contagens, n_imagens):
+        # contagens: resultado de contagens_regra
+        with perfil.etapa("agregacao"):
+            geral = contagens["geral"]
+            self.total_dentes += n_imagens * len(self.dentes)
+            self.verdadeiros_positivos += geral["verdadeiros_positivos"]
+            self.falsos_positivos += geral["falsos_positivos"]
+            self.falsos_negativos += geral["falsos_negativos"]
+            self.acertos += geral["acertos"]
+
     def old_model_score(self):
-        files_folder_anotacao, files_folder_output = self.obtem_dados(
-            self.old_model_path
-        )
+        dados = carrega_dados(self.anotacao_path, self.old_model_path)
 
-        for file_ot, file_an in zip(files_folder_output, files_folder_anotacao):
-            ot = read_file(self.old_model_path + file_ot)
-            an = read_file(self.anotacao_path + file_an)
-
-            if(splitext(file_ot)[0] != splitext(file_an)[0]):
-                print("ERRO: Arquivos diferentes")
-
-
-            self.total_dentes += 32
-
-            for dente in self.dentes:  # Para cada dente do corpo humano (32 dentes)
-                dente_ot = [
-                    entity for entity in ot["entities"] if entity["class_name"] == dente
-                ]
-                dente_an = [entity for entity in an if entity["label"] == dente]
-
-                if dente_ot:  # Existe um dente no modelo
-                    if dente_an:  # Existe um dente na anotação
-                        if dente_ot[0]["score"] > 0.1:  # Acerto
-                            self.acertos += 1
-                            self.verdadeiros_positivos += 1
-                        elif dente_ot[0]["score"] < 0.1:  # Falso negativo
-                            self.falsos_negativos += 1
-                    else:  # Não existe dente na anotação
-                        if dente_ot[0]["score"] > 0.1:  # Falso positivo
-                            self.falsos_positivos += 1
-                        elif dente_ot[0]["score"] < 0.1:  # Acerto
-                            self.acertos += 1
-                else:
-                    print(f"ERRO: O modelo (ANTIGO) não retornou o dente {dente}!")
-                    return
+        # O modelo antigo deve retornar todos os 32 dentes em todas as imagens
+        ausentes = ~dados.presenca.all(axis=0)
+        if ausentes.any():
+            dente = self.dentes[int(np.argmax(ausentes))]
+            print(f"ERRO: O modelo (ANTIGO) não retornou o dente {dente}!")
+            return
+
+        contagens = contagens_regra(dados, "old", confusao=True)
+        self.acumula(contagens, len(dados))
+        self.erros = indice_erros(dados, "old", contagens["confusao"])
 
     def new_model_score(self):
-        files_folder_anotacao, files_folder_output = self.obtem_dados(
-            self.new_model_path
+        dados = carrega_dados(self.anotacao_path, self.new_model_path)
+        contagens = contagens_regra(dados, "new", confusao=True)
+        self.acumula(contagens, len(dados))
+        self.erros = indice_erros(dados, "new", contagens["confusao"])
+
+
+def avalia_modelos(modelos, anotacao_path="test/anotacao/"):
+    # modelos: {nome: (pasta de saída, regra)}, com regra "old" (score acima do
+    # limiar) ou "new" (presença). As anotações são lidas uma única vez.
+    # Devolve {nome: (Avaliador, AvaliadorPorDente)}.
+    resultados = {}
+    for nome, (model_path, modelo) in modelos.items():
+        dados = carrega_dados(anotacao_path, model_path)
+        contagens = contagens_regra(dados, modelo, confusao=True)
+
+        geral = Avaliador()
+        geral.anotacao_path = anotacao_path
+        geral.acumula(contagens, len(dados))
+        geral.erros = indice_erros(dados, modelo, contagens["confusao"])
+
+        por_dente = AvaliadorPorDente()
+        por_dente.anotacao_path = anotacao_path
+        por_dente.acumula(contagens)
+
+        resultados[nome] = (geral, por_dente)
+    return resultados
+
+
+def mostra_tabela(resultados):
+    print(
+        f"{'Modelo':<30} {'Erro':>8} {'Acurácia':>9} {'Precisão':>9} "
+        f"{'Recall':>8} {'F1-Score':>9}"
+    )
+    for nome, (geral, _) in resultados.items():
+        erro, acuracia, precisao, recall, f1_score = geral.calcula_metricas()
+        print(
+            f"{nome:<30} {erro * 100:>7.2f}% {acuracia * 100:>8.2f}% "
+            f"{precisao * 100:>8.2f}% {recall * 100:>7.2f}% {f1_score:>9.4f}"
         )
 
-        for file_ot, file_an in zip(files_folder_output, files_folder_anotacao):
-            ot = read_file(self.new_model_path + file_ot)
-            an = read_file(self.anotacao_path + file_an)
-
-            self.total_dentes += 32
-
-            for dente in self.dentes:  # Para cada dente do corpo humano (32 dentes)
-                dente_ot = [
-                    entity for entity in ot["entities"] if entity["class_name"] == dente
-                ]
-                dente_an = [entity for entity in an if entity["label"] == dente]
-
-                if dente_ot:  # Existe um dente no modelo
-                    if dente_an:  # Existe um dente na anotação
-                        # Acerto
-                        self.acertos += 1
-                        self.verdadeiros_positivos += 1
-                    else:  # Não existe dente na anotação
-                        # Falso positivo
-                        self.falsos_positivos += 1
-                else:  # Não existe um dente no modelo
-                    if dente_an:  # Existe um dente na anotação
-                        # Falso negativo
-                        self.falsos_negativos += 1
-                    else:  # Não existe dente na anotação
-                        # Acerto
-                        self.acertos += 1
-
-
-def read_file(file_path):
-    with open(file_path, "r") as file:
-        data = json.loads(file.read())
-    return data
-
-
-def gera_dentes():
-    dentes = []
-    for quadrante in range(1, 5):  # Quadrantes 1 a 4
-        for posicao in range(1, 9):  # Posições 1 a 8
-            dentes.append(f"{quadrante}{posicao}")
-    return dentes
-
-
-def visualiza_modelos(old, new):
+
+def visualiza_modelos(*avaliadores, nomes=None):
     # Criando uma visualização gráfica
     metricas = [
         "Erro (%)",
@@ -181,24 +145,22 @@ def visualiza_modelos(old, new):
         "Recall (%)",
         "F1-Score",
     ]
-    erro_old, acuracia_old, precisao_old, recall_old, f1_score_old = (
-        old.calcula_metricas()
-    )
-    erro_new, acuracia_new, precisao_new, recall_new, f1_score_new = (
-        new.calcula_metricas()
-    )
+    if nomes is None:
+        nomes = (
+            ["Modelo Antigo", "Modelo Novo"]
+            if len(avaliadores) == 2
+            else [f"Modelo {i + 1}" for i in range(len(avaliadores))]
+        )
 
-    valores = [
-        [erro_old, acuracia_old, precisao_old, recall_old, f1_score_old],
-        [erro_new, acuracia_new, precisao_new, recall_new, f1_score_new],
-    ]
+    valores = [list(avaliador.calcula_metricas()) for avaliador in avaliadores]
 
-    # Criar o gráfico de barras
+    # Criar o gráfico de barras, um grupo por métrica e uma barra por modelo
     x = np.arange(len(metricas))
-    width = 0.35
+    width = 0.7 / len(avaliadores)
     fig, ax = plt.subplots()
-    ax.bar(x - width / 2, valores[0], width, label="Modelo Antigo")
-    ax.bar(x + width / 2, valores[1], width, label="Modelo Novo")
+    for i, (valor, nome) in enumerate(zip(valores, nomes)):
+        deslocamento = (i - (len(avaliadores) - 1) / 2) * width
+        ax.bar(x + deslocamento, valor, width, label=nome)
     # Adicionar rótulos e título
     ax.set_ylabel("Valor")
     ax.set_title("Comparação das Métricas dos Modelos")
@@ -210,7 +172,58 @@ def visualiza_modelos(old, new):
     plt.show()
 
 
+def visualiza_curvas(resultado, titulo, limiar_atual=LIMIAR_SCORE):
+    # Curvas Precisão x Recall e ROC de uma varredura de limiares
+    melhor = melhor_ponto(resultado)
+    # A regra antiga é score > limiar: na varredura (score >= limiar) é o ponto do
+    # menor limiar estritamente acima dele (limiares em ordem decrescente)
+    atual = int(np.searchsorted(-resultado["limiares"], -limiar_atual, side="left")) - 1
+
+    fig, axs = plt.subplots(1, 2, figsize=(12, 5))
+
+    axs[0].plot(resultado["recall"], resultado["precisao"])
+    axs[0].scatter(
+        melhor["recall"],
+        melhor["precisao"],
+        color="red",
+        label=f"Melhor F1 ({melhor['f1_score']:.3f}) em {melhor['limiares']:.3f}",
+    )
+    axs[0].scatter(
+        resultado["recall"][atual],
+        resultado["precisao"][atual],
+        color="green",
+        label=f"Limiar atual (score > {limiar_atual})",
+    )
+    axs[0].set_xlabel("Recall")
+    axs[0].set_ylabel("Precisão")
+    axs[0].set_title(f"Precisão x Recall - {titulo}")
+    axs[0].legend()
+
+    axs[1].plot(resultado["taxa_falsos_positivos"], resultado["recall"])
+    axs[1].scatter(
+        melhor["taxa_falsos_positivos"],
+        melhor["recall"],
+        color="red",
+        label="Melhor F1",
+    )
+    axs[1].scatter(
+        resultado["taxa_falsos_positivos"][atual],
+        resultado["recall"][atual],
+        color="green",
+        label=f"Limiar atual (score > {limiar_atual})",
+    )
+    axs[1].set_xlabel("Taxa de falsos positivos")
+    axs[1].set_ylabel("Taxa de verdadeiros positivos (Recall)")
+    axs[1].set_title(f"Curva ROC - {titulo}")
+    axs[1].legend()
+
+    plt.tight_layout()
+    plt.show()
+
+
 if __name__ == "__main__":
+    perfil.ativa_pela_linha_de_comando()
+
     print("------------- OLD Model ---------------")
     old = Avaliador()
     old.old_model_score()
@@ -221,4 +234,17 @@ if __name__ == "__main__":
     new.new_model_score()
     new.mostra_metricas()
 
-    visualiza_modelos(old, new)
+    with perfil.etapa("grafico"):
+        visualiza_modelos(old, new)
+
+    curvas = varredura_limiares(carrega_dados(old.anotacao_path, old.old_model_path))
+    with perfil.etapa("grafico"):
+        visualiza_curvas(curvas, "Modelo Antigo")
+
+    perfil.mostra_relatorio()
+    perfil.salva_relatorio(
+        metricas={
+            nome: dict(zip(METRICAS, avaliador.calcula_metricas()))
+            for nome, avaliador in (("old", old), ("new", new))
+        }
+    )
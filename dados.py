@@ -0,0 +1,712 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import zipfile
+import numpy as np
+
+from os import listdir
+from os.path import isfile, join
+
+import perfil
+
+from bits import contagens_por_dente_bits, desempacota, empacota, popcount
+from pacotes import abre_pacote, eh_pacote
+from pareamento import IndicePares, caminho_indice, lista_pasta
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+LIMIAR_SCORE = 0.1
+METRICAS = ["erro", "acuracia", "precisao", "recall", "f1_score"]
+CACHE_DIR = ".cache_dados/"
+
+
+class Dados:
+    def __init__(
+        self, nomes, anotacao, presenca, score, eixo_anotacao=None, eixo_modelo=None
+    ):
+        self.nomes = nomes  # Nomes base (sem extensão), um por imagem
+        # Presença na anotação e na saída do modelo: (n_imagens, 32) bool ou já
+        # empacotadas em (n_imagens,) uint32 (bits.py); guardadas empacotadas
+        self.bits_anotacao = palavras(anotacao)
+        self.bits_presenca = palavras(presenca)
+        self.score = score  # (n_imagens, 32) float: score do modelo (nan se ausente)
+        # Score acima / abaixo de LIMIAR_SCORE, empacotados na carga: as regras
+        # "old" e "new" são avaliadas só com operações bit a bit e popcount
+        self.bits_acima = empacota(score > LIMIAR_SCORE) & self.bits_presenca
+        self.bits_abaixo = empacota(score < LIMIAR_SCORE) & self.bits_presenca
+        # (n_imagens, 32, 2, 2) float: pontos [[x, y], [x, y]] do longo eixo
+        self.eixo_anotacao = eixo_anotacao
+        self.eixo_modelo = eixo_modelo
+
+    @property
+    def anotacao(self):
+        # (n_imagens, 32) bool: dente presente na anotação (desempacotado a cada uso)
+        return desempacota(self.bits_anotacao)
+
+    @property
+    def presenca(self):
+        # (n_imagens, 32) bool: dente retornado pelo modelo
+        return desempacota(self.bits_presenca)
+
+    def __len__(self):
+        return len(self.nomes)
+
+
+def palavras(mascara):
+    # Máscara (n, 32) bool empacotada em (n,) uint32; palavras passam direto
+    mascara = np.asarray(mascara)
+    if mascara.dtype == np.uint32:
+        return mascara
+    return empacota(mascara)
+
+
+# Leitores de JSON disponíveis. orjson é opcional e, quando instalado, é o
+# padrão; AVALIADOR_JSON=json força a biblioteca padrão.
+LEITORES_JSON = {"json": json.loads}
+if orjson is not None:
+    LEITORES_JSON["orjson"] = orjson.loads
+leitor_json = LEITORES_JSON.get(
+    os.environ.get("AVALIADOR_JSON", ""), LEITORES_JSON.get("orjson", json.loads)
+)
+
+
+def define_leitor_json(nome):
+    global leitor_json
+    leitor_json = LEITORES_JSON[nome]
+
+
+def read_file(file_path):
+    with open(file_path, "rb") as file:
+        return leitor_json(file.read())
+
+
+def gera_dentes():
+    return [
+        f"{quadrante}{posicao}" for quadrante in range(1, 5) for posicao in range(1, 9)
+    ]
+
+
+DENTES = gera_dentes()
+INDICE_DENTE = {dente: i for i, dente in enumerate(DENTES)}
+
+
+def obtem_dados(anotacao_path, model_path):
+    # Listas alinhadas de arquivos de anotação e de saída com o mesmo nome base
+    return indice_pares(anotacao_path, model_path).arquivos()
+
+
+def extrai_anotacao(an, anotacao, eixo):
+    # Preenche as linhas (32,) e (32, 2, 2) já alocadas com a presença e o longo
+    # eixo (pts) dos dentes de uma anotação já decodificada; os demais campos não
+    # são copiados. A presença só depende de label: sem os dois pontos de pts o
+    # eixo fica nan.
+    perfil.conta("entidades", len(an))
+    indices = []
+    pontos = []
+    for entity in an:
+        i = INDICE_DENTE.get(entity["label"])
+        if i is not None and i not in indices:  # Vale a primeira ocorrência do dente
+            indices.append(i)
+            pts = entity.get("pts")
+            if pts and len(pts) >= 2:
+                p0, p1 = pts[:2]
+                pontos.append((p0["x"], p0["y"], p1["x"], p1["y"]))
+            else:
+                pontos.append((np.nan,) * 4)
+    perfil.conta("dentes", len(indices))
+    if indices:
+        anotacao[indices] = True
+        eixo[indices] = np.array(pontos).reshape(-1, 2, 2)
+
+
+def extrai_saida(ot, presenca, score, eixo):
+    # Preenche as linhas já alocadas com presença, score e longo eixo (line) dos
+    # dentes da saída do modelo já decodificada; os demais campos não são
+    # copiados. A presença só depende de class_name: sem score ou line os valores
+    # ficam nan.
+    perfil.conta("entidades", len(ot["entities"]))
+    indices = []
+    scores = []
+    pontos = []
+    for entity in ot["entities"]:
+        i = INDICE_DENTE.get(entity["class_name"])
+        if i is not None and i not in indices:  # Vale a primeira ocorrência do dente
+            indices.append(i)
+            scores.append(entity.get("score", np.nan))
+            line = entity.get("line")
+            if line and len(line) >= 2:
+                (x0, y0), (x1, y1) = line[:2]
+                pontos.append((x0, y0, x1, y1))
+            else:
+                pontos.append((np.nan,) * 4)
+    perfil.conta("dentes", len(indices))
+    if indices:
+        presenca[indices] = True
+        score[indices] = scores
+        eixo[indices] = np.array(pontos).reshape(-1, 2, 2)
+
+
+def linha_anotacao(an):
+    # Presença e longo eixo (pts) de cada um dos 32 dentes em uma anotação
+    linha = np.zeros(len(DENTES), dtype=bool)
+    eixo = np.full((len(DENTES), 2, 2), np.nan)
+    extrai_anotacao(an, linha, eixo)
+    return linha, eixo
+
+
+def linha_saida(ot):
+    # Presença, score e longo eixo (line) de cada um dos 32 dentes na saída do modelo
+    presenca = np.zeros(len(DENTES), dtype=bool)
+    score = np.full(len(DENTES), np.nan)
+    eixo = np.full((len(DENTES), 2, 2), np.nan)
+    extrai_saida(ot, presenca, score, eixo)
+    return presenca, score, eixo
+
+
+# Campos extraídos de cada tipo de pasta, na ordem usada por preenche_linha:
+# (nome, dtype, valor para dente ausente, forma por dente)
+CAMPOS_PASTA = {
+    "anotacao": (
+        ("anotacao", bool, False, ()),
+        ("eixo_anotacao", np.float64, np.nan, (2, 2)),
+    ),
+    "saida": (
+        ("presenca", bool, False, ()),
+        ("score", np.float64, np.nan, ()),
+        ("eixo_modelo", np.float64, np.nan, (2, 2)),
+    ),
+}
+# Campos guardados empacotados (bits.py), no cache e em memória: um uint32 por
+# arquivo em vez de 32 bool. São extraídos em uma linha bool temporária.
+CAMPOS_BITS = ("anotacao", "presenca")
+VERSAO_CACHE = 4
+
+# Pastas já lidas neste processo: (caminho, tipo) -> (nomes, tamanhos, mtimes, arrays)
+_pastas = {}
+_indices = {}
+_carregados = {}
+
+
+def preenche_linha(arrays, i, caminho, tipo):
+    # Lê um arquivo direto para a linha i dos arrays da pasta
+    with perfil.etapa("io"):
+        with open(caminho, "rb") as file:
+            conteudo = file.read()
+    preenche_conteudo(arrays, i, conteudo, tipo)
+
+
+def preenche_conteudo(arrays, i, conteudo, tipo):
+    # Extrai o conteúdo (bytes) de um arquivo ou registro para a linha i
+    perfil.conta("arquivos")
+    perfil.conta("bytes", len(conteudo))
+    with perfil.etapa("parse"):
+        dado = leitor_json(conteudo)
+        linhas = [
+            (
+                np.zeros(len(DENTES), dtype=bool)
+                if campo in CAMPOS_BITS
+                else arrays[campo][i]
+            )
+            for campo, _, _, _ in CAMPOS_PASTA[tipo]
+        ]
+        if tipo == "anotacao":
+            extrai_anotacao(dado, *linhas)
+        else:
+            extrai_saida(dado, *linhas)
+        for (campo, _, _, _), linha in zip(CAMPOS_PASTA[tipo], linhas):
+            if campo in CAMPOS_BITS:
+                arrays[campo][i] = empacota(linha)
+
+
+def pasta_cache(path, tipo, cache_dir):
+    chave = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:16]
+    return join(cache_dir, f"{tipo}_{chave}")
+
+
+def le_cache(destino, tipo):
+    # Devolve (nomes, tamanhos, mtimes, arrays) mapeados em memória, ou None
+    try:
+        with open(join(destino, "manifesto.json")) as file:
+            manifesto = json.load(file)
+        if manifesto["versao"] != VERSAO_CACHE or manifesto["tipo"] != tipo:
+            return None
+        pasta = join(destino, manifesto["arrays"])
+        nomes, tamanhos, mtimes = (
+            np.load(join(pasta, f"{nome}.npy"), mmap_mode="r")
+            for nome in ("nomes", "tamanhos", "mtimes")
+        )
+        arrays = {
+            campo: np.load(join(pasta, f"{campo}.npy"), mmap_mode="r")
+            for campo, _, _, _ in CAMPOS_PASTA[tipo]
+        }
+    except (OSError, ValueError, KeyError):
+        return None
+    if any(
+        len(a) != manifesto["n"] for a in (nomes, tamanhos, mtimes, *arrays.values())
+    ):
+        return None
+    return nomes, tamanhos, mtimes, arrays
+
+
+def grava_manifesto(manifesto, conteudo):
+    with open(manifesto + ".tmp", "w") as file:
+        json.dump(conteudo, file)
+    os.replace(manifesto + ".tmp", manifesto)
+
+
+def salva_cache(destino, path, tipo, nomes, tamanhos, mtimes, arrays):
+    # Cada versão do cache vai para uma pasta nova e o manifesto passa a apontar
+    # para ela: arrays ainda mapeados em memória (por este ou outro processo)
+    # nunca são sobrescritos, o que falharia no Windows
+    os.makedirs(destino, exist_ok=True)
+    manifesto = join(destino, "manifesto.json")
+    try:
+        with open(manifesto) as file:
+            anterior = json.load(file)
+        antigas = [anterior["arrays"], *anterior.get("antigas", [])]
+    except (OSError, ValueError, KeyError):
+        # Sem manifesto válido (ou de uma versão anterior do cache)
+        antigas = [nome for nome in listdir(destino) if nome.endswith(".npy")]
+
+    pasta = tempfile.mkdtemp(prefix="arrays_", dir=destino)
+    for nome, array in (
+        ("nomes", nomes),
+        ("tamanhos", tamanhos),
+        ("mtimes", mtimes),
+        *arrays.items(),
+    ):
+        np.save(join(pasta, f"{nome}.npy"), np.asarray(array))
+    conteudo = {
+        "versao": VERSAO_CACHE,
+        "tipo": tipo,
+        "path": os.path.abspath(path),
+        "n": len(nomes),
+        "arrays": os.path.basename(pasta),
+    }
+    grava_manifesto(manifesto, conteudo)
+
+    # Versões anteriores que ainda não podem ser apagadas (mapeadas em memória
+    # no Windows) ficam no manifesto para a próxima gravação
+    restantes = []
+    for antiga in antigas:
+        caminho = join(destino, antiga)
+        try:
+            if isfile(caminho):
+                os.remove(caminho)
+            else:
+                shutil.rmtree(caminho)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            restantes.append(antiga)
+    if restantes:
+        grava_manifesto(manifesto, {**conteudo, "antigas": restantes})
+
+
+def carrega_pasta(path, tipo, cache_dir=CACHE_DIR, listagem=None, leitor=None):
+    # Lê uma pasta de anotações ("anotacao") ou de saídas de modelo ("saida").
+    # Só os arquivos novos ou alterados (tamanho/mtime) são lidos de novo.
+    # listagem: (nomes, tamanhos, mtimes) já obtidos com lista_pasta, se houver
+    # leitor: leitor(caminhos, tipo) que devolve, na ordem, as linhas de cada
+    # arquivo (ver pipeline.leitor_pipeline); por padrão a leitura é sequencial.
+    # Pastas empacotadas (pacotes.py) são lidas dos pacotes mapeados em memória.
+    nomes, tamanhos, mtimes = listagem if listagem is not None else lista_pasta(path)
+    chave = (os.path.abspath(path), tipo)
+
+    anterior = _pastas.get(chave)
+    destino = pasta_cache(path, tipo, cache_dir) if cache_dir else None
+    if anterior is None and destino:
+        anterior = le_cache(destino, tipo)
+
+    if anterior is not None:
+        nomes_ant, tamanhos_ant, mtimes_ant, arrays_ant = anterior
+        if (
+            len(nomes_ant) == len(nomes)
+            and np.array_equal(nomes_ant, nomes)
+            and np.array_equal(tamanhos_ant, tamanhos)
+            and np.array_equal(mtimes_ant, mtimes)
+        ):
+            _pastas[chave] = anterior
+            return nomes, arrays_ant
+
+        # Linha correspondente no cache de cada arquivo (-1 se novo ou alterado)
+        posicao = np.searchsorted(nomes_ant, nomes)
+        posicao = np.minimum(posicao, max(len(nomes_ant) - 1, 0))
+        valido = np.zeros(len(nomes), dtype=bool)
+        if len(nomes_ant):
+            valido = (
+                (np.asarray(nomes_ant)[posicao] == nomes)
+                & (np.asarray(tamanhos_ant)[posicao] == tamanhos)
+                & (np.asarray(mtimes_ant)[posicao] == mtimes)
+            )
+    else:
+        arrays_ant = None
+        valido = np.zeros(len(nomes), dtype=bool)
+
+    arrays = {}
+    for campo, dtype, vazio, forma in CAMPOS_PASTA[tipo]:
+        if campo in CAMPOS_BITS:
+            arrays[campo] = np.zeros(len(nomes), dtype=np.uint32)
+        else:
+            arrays[campo] = np.full(
+                (len(nomes), len(DENTES), *forma), vazio, dtype=dtype
+            )
+        if valido.any():
+            arrays[campo][valido] = np.asarray(arrays_ant[campo])[posicao[valido]]
+
+    # Arquivos removidos simplesmente não entram nos novos arrays
+    alterados = np.flatnonzero(~valido)
+    if eh_pacote(path):
+        pacote = abre_pacote(path)
+        # Listagem do índice: a linha i da pasta é o registro i do pacote
+        linhas = np.searchsorted(pacote.nomes, nomes)
+        for i in alterados:
+            with perfil.etapa("io"):
+                conteudo = pacote.registro(linhas[i])
+            preenche_conteudo(arrays, i, conteudo, tipo)
+    elif leitor is None:
+        for i in alterados:
+            preenche_linha(arrays, i, join(path, nomes[i]), tipo)
+    else:
+        caminhos = [join(path, nomes[i]) for i in alterados]
+        for i, linhas in zip(alterados, leitor(caminhos, tipo)):
+            for (campo, _, _, _), linha in zip(CAMPOS_PASTA[tipo], linhas):
+                arrays[campo][i] = empacota(linha) if campo in CAMPOS_BITS else linha
+
+    if destino:
+        salva_cache(destino, path, tipo, nomes, tamanhos, mtimes, arrays)
+    _pastas[chave] = (nomes, tamanhos, mtimes, arrays)
+    return nomes, arrays
+
+
+def limpa_cache(cache_dir=CACHE_DIR):
+    # Remove entradas do cache cujas pastas de origem não existem mais
+    if not os.path.isdir(cache_dir):
+        return
+    for entrada in listdir(cache_dir):
+        destino = join(cache_dir, entrada)
+        try:
+            if isfile(destino):  # Índice de pares (pareamento.IndicePares)
+                with np.load(destino) as indice:
+                    origens = [str(indice["anotacao_path"]), str(indice["model_path"])]
+            else:
+                with open(join(destino, "manifesto.json")) as file:
+                    origens = [json.load(file)["path"]]
+        except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+            origens = [None]
+        if any(origem is None or not os.path.isdir(origem) for origem in origens):
+            if isfile(destino):
+                os.remove(destino)
+            else:
+                shutil.rmtree(destino, ignore_errors=True)
+
+
+def indice_pares(anotacao_path, model_path, cache_dir=CACHE_DIR):
+    # Índice de pares atualizado, persistido em cache_dir entre execuções
+    chave = (os.path.abspath(anotacao_path), os.path.abspath(model_path))
+    if chave not in _indices:
+        indice_path = None
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            indice_path = caminho_indice(anotacao_path, model_path, cache_dir)
+        _indices[chave] = IndicePares(anotacao_path, model_path, indice_path)
+    indice = _indices[chave]
+    with perfil.etapa("pareamento"):
+        indice.atualiza()
+    # Arquivos sem par são mostrados uma vez por processo (e de novo se mudarem)
+    if not indice.avisado:
+        indice.mostra_sem_par()
+    return indice
+
+
+def carrega_dados(anotacao_path, model_path, cache_dir=CACHE_DIR, leitor=None):
+    indice = indice_pares(anotacao_path, model_path, cache_dir)
+    _, arrays_an = carrega_pasta(
+        anotacao_path, "anotacao", cache_dir, indice.listagem_an, leitor
+    )
+    _, arrays_ot = carrega_pasta(
+        model_path, "saida", cache_dir, indice.listagem_ot, leitor
+    )
+
+    chave = (anotacao_path, model_path)
+    anterior = _carregados.get(chave)
+    if (
+        anterior is not None
+        and anterior[0] is arrays_an["anotacao"]
+        and anterior[1] is arrays_ot["presenca"]
+        and anterior[2] is indice.linhas_ot
+    ):
+        return anterior[3]
+
+    linhas_an = indice.linhas_an
+    linhas_ot = indice.linhas_ot
+    nomes = [str(base) for base in indice.bases]
+    dados = Dados(
+        nomes,
+        np.asarray(arrays_an["anotacao"])[linhas_an],
+        np.asarray(arrays_ot["presenca"])[linhas_ot],
+        np.asarray(arrays_ot["score"])[linhas_ot],
+        np.asarray(arrays_an["eixo_anotacao"])[linhas_an],
+        np.asarray(arrays_ot["eixo_modelo"])[linhas_ot],
+    )
+    _carregados[chave] = (
+        arrays_an["anotacao"],
+        arrays_ot["presenca"],
+        indice.linhas_ot,
+        dados,
+    )
+    return dados
+
+
+class Regra:
+    # Regra de avaliação: quais dentes o modelo dá como presentes (positivo) ou
+    # ausentes (negativo), como máscaras (n_imagens, 32). Dentes fora das duas
+    # máscaras não são contabilizados.
+    # criterio="presenca": positivo se o dente foi retornado pelo modelo.
+    # criterio="score": positivo se retornado e score > limiar (operador ">") ou
+    # score >= limiar (">="); limiar é um número, um dict {dente: limiar} (dentes
+    # fora do dict usam LIMIAR_SCORE) ou um array (32,). Com ignora_empate, os
+    # negativos são só os dentes retornados com score abaixo do limiar, como no
+    # modelo antigo; senão todo dente que não é positivo é negativo.
+    def __init__(
+        self,
+        criterio="presenca",
+        operador=">",
+        limiar=LIMIAR_SCORE,
+        ignora_empate=False,
+    ):
+        if criterio not in ("presenca", "score") or operador not in (">", ">="):
+            raise ValueError(f"Regra inválida: {criterio} {operador}")
+        self.criterio = criterio
+        self.operador = operador
+        self.ignora_empate = ignora_empate
+        if isinstance(limiar, dict):
+            limiar = [limiar.get(dente, LIMIAR_SCORE) for dente in DENTES]
+        self.limiares = np.broadcast_to(
+            np.asarray(limiar, dtype=np.float64), (len(DENTES),)
+        ).copy()
+
+    def __repr__(self):
+        if self.criterio == "presenca":
+            return "presenca"
+        limiares = np.unique(self.limiares)
+        limiar = (
+            f"{float(limiares[0])!r}"
+            if len(limiares) == 1
+            else "[" + ", ".join(repr(float(v)) for v in self.limiares) + "]"
+        )
+        empate = " (empate ignorado)" if self.ignora_empate else ""
+        return f"score {self.operador} {limiar}{empate}"
+
+    def __eq__(self, outra):
+        return isinstance(outra, Regra) and repr(self) == repr(outra)
+
+    def __hash__(self):
+        return hash(repr(self))
+
+    def mascaras(self, dados):
+        if self.criterio == "presenca":
+            return dados.presenca, ~dados.presenca
+        if self.operador == ">":
+            positivo = dados.presenca & (dados.score > self.limiares)
+        else:
+            positivo = dados.presenca & (dados.score >= self.limiares)
+        if self.ignora_empate:
+            negativo = dados.presenca & (dados.score < self.limiares)
+        else:
+            negativo = ~positivo
+        return positivo, negativo
+
+    def mascaras_bits(self, dados):
+        # As mesmas máscaras, empacotadas (n_imagens,) uint32, a partir dos bits
+        # guardados em Dados; None se a regra não pode ser expressa com eles
+        # (limiar diferente de LIMIAR_SCORE ou operador ">=")
+        if self.criterio == "presenca":
+            return dados.bits_presenca, ~dados.bits_presenca
+        if self.operador != ">" or np.any(self.limiares != LIMIAR_SCORE):
+            return None
+        positivo = dados.bits_acima
+        negativo = dados.bits_abaixo if self.ignora_empate else ~positivo
+        return positivo, negativo
+
+
+# "old": dentes com score exatamente igual ao limiar não são contabilizados
+REGRAS = {
+    "old": Regra("score", ">", LIMIAR_SCORE, ignora_empate=True),
+    "new": Regra("presenca"),
+}
+REGRAS["presenca"] = REGRAS["new"]
+
+
+def regra(modelo):
+    # Regra a partir de um objeto Regra, de um nome em REGRAS ou de um texto
+    # "score > t" / "score >= t" (ou "≥")
+    if isinstance(modelo, Regra):
+        return modelo
+    if modelo in REGRAS:
+        return REGRAS[modelo]
+    encontrado = re.fullmatch(r"\s*score\s*(>=|≥|>)\s*([-+0-9.eE]+)\s*", modelo)
+    if not encontrado:
+        raise ValueError(f"Regra desconhecida: {modelo!r}")
+    operador = ">=" if encontrado[1] in (">=", "≥") else ">"
+    return Regra("score", operador, float(encontrado[2]))
+
+
+# Ordem das máscaras de mascaras_confusao
+CONFUSAO = [
+    "verdadeiros_positivos",
+    "falsos_positivos",
+    "falsos_negativos",
+    "verdadeiros_negativos",
+]
+
+
+def palavras_confusao(dados, modelo="old"):
+    # VP, FP, FN e VN empacotados (4, n_imagens) uint32, na ordem de CONFUSAO,
+    # com operações bit a bit; None se a regra precisa das máscaras bool
+    mascaras = regra(modelo).mascaras_bits(dados)
+    if mascaras is None:
+        return None
+    positivo, negativo = mascaras
+    an = dados.bits_anotacao
+    return np.stack([an & positivo, ~an & positivo, an & negativo, ~an & negativo])
+
+
+def mascaras_confusao(dados, modelo="old", palavras=None):
+    # Kernel único das regras: array (4, n_imagens, 32) de bool com VP, FP, FN e
+    # VN de cada (imagem, dente), na ordem de CONFUSAO. Regras que cabem nos bits
+    # de Dados são desempacotadas de palavras_confusao (ou de palavras, se já
+    # calculadas); as demais comparam o score dente a dente.
+    with perfil.etapa("score"):
+        if palavras is None:
+            palavras = palavras_confusao(dados, modelo)
+        if palavras is not None:
+            return desempacota(palavras)
+        an = dados.anotacao
+        positivo, negativo = regra(modelo).mascaras(dados)
+        mascaras = np.empty((4, *an.shape), dtype=bool)
+        ausente = ~an
+        np.logical_and(an, positivo, out=mascaras[0])
+        np.logical_and(ausente, positivo, out=mascaras[1])
+        np.logical_and(an, negativo, out=mascaras[2])
+        np.logical_and(ausente, negativo, out=mascaras[3])
+        return mascaras
+
+
+def matrizes_confusao(dados, modelo="old"):
+    # Classificação de cada (imagem, dente) como arrays (n_imagens, 32) de bool
+    # (vistas de mascaras_confusao). modelo: regra de avaliação (ver regra())
+    return dict(zip(CONFUSAO, mascaras_confusao(dados, modelo)))
+
+
+def contagens_regra(dados, modelo="old", por_imagem_dente=False, confusao=False):
+    # Contagens gerais, por dente e por imagem de uma regra em uma única passada.
+    # Com as regras que cabem nos bits de Dados, as contagens por imagem são o
+    # popcount de cada palavra e as por dente vêm do fatiamento por bit, sem
+    # desempacotar; as demais somam mascaras_confusao nos dois eixos.
+    # "por_imagem": (n_imagens, 4) uint8 com acertos, VP, FP e FN de cada imagem;
+    # "por_dente": (4, 32) int64 com VP, FP, FN e VN; "geral": totais.
+    # por_imagem_dente=True inclui (n_imagens, 32, 4) uint8 com as mesmas
+    # contagens por dente, e confusao=True as matrizes de matrizes_confusao.
+    palavras = palavras_confusao(dados, modelo)
+    mascaras = None
+    if palavras is None or por_imagem_dente or confusao:
+        mascaras = mascaras_confusao(dados, modelo, palavras)
+    with perfil.etapa("score"):
+        if palavras is not None:
+            # No máximo 32 dentes por imagem: cabe em um byte
+            vp, fp, fn, vn = popcount(palavras).astype(np.uint8)
+            por_dente = contagens_por_dente_bits(palavras)
+        else:
+            uns = mascaras.view(np.uint8)
+            vp, fp, fn, vn = uns.sum(axis=2, dtype=np.uint8)
+            por_dente = uns.sum(axis=1, dtype=np.int64)
+
+    geral = por_dente.sum(axis=1)
+    contagens = {
+        "por_imagem": np.stack([vp + vn, vp, fp, fn], axis=1),
+        "por_dente": por_dente,
+        "geral": {
+            "acertos": int(geral[0] + geral[3]),
+            "verdadeiros_positivos": int(geral[0]),
+            "falsos_positivos": int(geral[1]),
+            "falsos_negativos": int(geral[2]),
+            "verdadeiros_negativos": int(geral[3]),
+        },
+    }
+    if por_imagem_dente:
+        uns = mascaras.view(np.uint8)
+        contagens["por_imagem_dente"] = np.stack(
+            [uns[0] + uns[3], uns[0], uns[1], uns[2]], axis=2
+        )
+    if confusao:
+        contagens["confusao"] = dict(zip(CONFUSAO, mascaras))
+    return contagens
+
+
+def metricas_contagens(acertos, vp, fp, fn, total):
+    # Mesmas fórmulas de Avaliador.calcula_metricas, aplicadas elemento a elemento.
+    # Denominadores nulos resultam em nan em vez de ZeroDivisionError e, como em
+    # metricas_por_dentes, o F1 é 0 quando precisão e recall são 0.
+    with np.errstate(divide="ignore", invalid="ignore"):
+        erro = (fp + fn) / total
+        acuracia = acertos / total
+        precisao = vp / (vp + fp)
+        recall = vp / (vp + fn)
+        f1_score = (2 * precisao * recall) / (precisao + recall)
+        f1_score = np.where(precisao + recall == 0, 0.0, f1_score)
+
+    return {
+        "erro": erro,
+        "acuracia": acuracia,
+        "precisao": precisao,
+        "recall": recall,
+        "f1_score": f1_score,
+    }
+
+
+def soma_por_grupo(valores, grupos, n_grupos):
+    # Soma das linhas de valores (n, ...) de cada grupo: (n_grupos, ...)
+    ordem = np.argsort(grupos, kind="stable")
+    quantidade = np.bincount(grupos, minlength=n_grupos)
+    somas = np.zeros((n_grupos, *valores.shape[1:]), dtype=np.int64)
+    if valores.dtype.kind == "f":
+        somas = somas.astype(np.float64)
+    tem = quantidade > 0
+    if tem.any():
+        inicio = np.r_[0, np.cumsum(quantidade)[:-1]][tem]
+        somas[tem] = np.add.reduceat(
+            valores[ordem].astype(somas.dtype, copy=False), inicio, axis=0
+        )
+    return somas
+
+
+def contagens_unidades(contagens, grupos=None, n_grupos=0):
+    # Contagens das unidades sorteadas pelo Monte Carlo ou deixadas de fora pelo
+    # jackknife. (n_imagens, 4) de contagens_regra ganha a coluna com o número de
+    # imagens: (n_imagens, 5); (n_imagens, 32, 4) por dente fica como está.
+    # Com grupos (o grupo de cada imagem, como os ids de clinicas.clinicas), as
+    # linhas são somadas por grupo: (n_grupos, ...).
+    if contagens.ndim == 2:
+        contagens = np.column_stack(
+            [contagens, np.ones(len(contagens), dtype=np.uint8)]
+        )
+    if grupos is not None:
+        contagens = soma_por_grupo(contagens, grupos, n_grupos)
+    return contagens
+
+
+def metricas_unidades(totais, por_dente=False):
+    # Métricas de somas de contagens_unidades: (..., 5) ou, por dente, (..., 32, 4)
+    if por_dente:
+        acertos, vp, fp, fn = np.moveaxis(totais, -1, 0)
+        # Como em metricas_por_dentes, o total de cada dente é acertos + erros
+        return metricas_contagens(acertos, vp, fp, fn, acertos + fp + fn)
+    acertos, vp, fp, fn, imagens = np.moveaxis(totais, -1, 0)
+    return metricas_contagens(acertos, vp, fp, fn, imagens * len(DENTES))
@@ -0,0 +1,155 @@
+import sys
+import numpy as np
+
+from clinicas import clinicas
+from dados import DENTES, INDICE_DENTE, carrega_dados, matrizes_confusao
+from geometria import METRICAS_GEOMETRICAS, erros_eixo
+
+# Códigos da coluna resultado
+RESULTADOS = ["falsos_positivos", "falsos_negativos"]
+
+
+class IndiceErros:
+    # Tabela em colunas com uma linha por (imagem, dente) classificado como falso
+    # positivo ou falso negativo. As linhas ficam ordenadas por (resultado, dente,
+    # score decrescente); inicios[r * 32 + d] marca o começo de cada grupo. Para
+    # consultas por clínica, ordem_clinica lista as linhas por (resultado,
+    # clínica) e inicios_clinica marca cada grupo.
+    def __init__(self, nomes, rotulos_clinicas, colunas):
+        self.nomes = nomes  # Nome base de cada imagem
+        self.rotulos_clinicas = rotulos_clinicas  # Nome de cada clínica
+        # imagem, clinica (int32), dente, resultado (int8), score e erros
+        # geométricos (float32, nan sem os dois eixos). Só falsos negativos com
+        # eixo previsto (score abaixo do limiar em regras de score) têm
+        # geometria; falsos positivos não têm eixo anotado e os falsos negativos
+        # da regra de presença não têm eixo previsto.
+        self.colunas = colunas
+
+        n_dentes = len(DENTES)
+        chave = self.colunas["resultado"] * n_dentes + self.colunas["dente"]
+        self.inicios = np.searchsorted(chave, np.arange(len(RESULTADOS) * n_dentes + 1))
+        chave_clinica = (
+            self.colunas["resultado"].astype(np.int64) * len(rotulos_clinicas)
+            + self.colunas["clinica"]
+        )
+        self.ordem_clinica = np.argsort(chave_clinica, kind="stable")
+        self.inicios_clinica = np.searchsorted(
+            chave_clinica[self.ordem_clinica],
+            np.arange(len(RESULTADOS) * len(rotulos_clinicas) + 1),
+        )
+
+    def __len__(self):
+        return len(self.colunas["imagem"])
+
+    def grupo(self, resultado, dente):
+        # Linhas de um resultado em um dente, já em ordem de score decrescente
+        g = RESULTADOS.index(resultado) * len(DENTES) + INDICE_DENTE[dente]
+        return np.arange(self.inicios[g], self.inicios[g + 1])
+
+    def maiores_scores(self, dente, resultado="falsos_positivos", k=10):
+        return self.grupo(resultado, dente)[:k]
+
+    def da_clinica(self, clinica, resultado="falsos_negativos"):
+        i = int(np.searchsorted(self.rotulos_clinicas, clinica))
+        if i == len(self.rotulos_clinicas) or self.rotulos_clinicas[i] != clinica:
+            return np.array([], dtype=np.intp)
+        g = RESULTADOS.index(resultado) * len(self.rotulos_clinicas) + i
+        return self.ordem_clinica[self.inicios_clinica[g] : self.inicios_clinica[g + 1]]
+
+    def linhas(self, indices):
+        # Linhas selecionadas como dicionários legíveis
+        c = self.colunas
+        return [
+            {
+                "imagem": str(self.nomes[c["imagem"][i]]),
+                "clinica": str(self.rotulos_clinicas[c["clinica"][i]]),
+                "dente": DENTES[c["dente"][i]],
+                "resultado": RESULTADOS[c["resultado"][i]],
+                "score": float(c["score"][i]),
+                **{nome: float(c[nome][i]) for nome in METRICAS_GEOMETRICAS},
+            }
+            for i in indices
+        ]
+
+    def mostra(self, indices):
+        for linha in self.linhas(indices):
+            texto = (
+                f"{linha['imagem']} dente {linha['dente']}: {linha['resultado']}, "
+                f"score {linha['score']:.3f}"
+            )
+            if np.isfinite(linha["erro_angulo"]):
+                texto += f", erro de ângulo {linha['erro_angulo']:.1f}°"
+            print(texto)
+
+    def salva(self, path):
+        with open(path, "wb") as file:
+            np.savez(
+                file,
+                nomes=self.nomes,
+                rotulos_clinicas=self.rotulos_clinicas,
+                **self.colunas,
+            )
+
+
+def carrega_indice_erros(path):
+    with np.load(path) as arquivo:
+        colunas = {
+            nome: arquivo[nome]
+            for nome in arquivo.files
+            if nome not in ("nomes", "rotulos_clinicas")
+        }
+        return IndiceErros(arquivo["nomes"], arquivo["rotulos_clinicas"], colunas)
+
+
+def indice_erros(dados, modelo="old", confusao=None):
+    # Índice dos erros de uma avaliação; confusao pode vir da passada principal
+    confusao = confusao if confusao is not None else matrizes_confusao(dados, modelo)
+    rotulos, ids = clinicas(dados.nomes)
+    imagens, dentes, resultados = [], [], []
+    for codigo, nome in enumerate(RESULTADOS):
+        i, d = np.nonzero(confusao[nome])
+        imagens.append(i)
+        dentes.append(d)
+        resultados.append(np.full(len(i), codigo, dtype=np.int8))
+    imagens = np.concatenate(imagens)
+    dentes = np.concatenate(dentes)
+    resultados = np.concatenate(resultados)
+    score = dados.score[imagens, dentes].astype(np.float32)
+
+    # Ordem (resultado, dente, score decrescente), com nan no fim de cada grupo
+    ordem = np.lexsort((np.nan_to_num(-score, nan=np.inf), dentes, resultados))
+    imagens, dentes, resultados, score = (
+        imagens[ordem],
+        dentes[ordem],
+        resultados[ordem],
+        score[ordem],
+    )
+    colunas = {
+        "imagem": imagens.astype(np.int32),
+        "clinica": ids[imagens].astype(np.int32),
+        "dente": dentes.astype(np.int8),
+        "resultado": resultados,
+        "score": score,
+    }
+    if dados.eixo_anotacao is not None and dados.eixo_modelo is not None:
+        geometria = erros_eixo(
+            dados.eixo_anotacao[imagens, dentes], dados.eixo_modelo[imagens, dentes]
+        )
+    else:
+        geometria = {
+            nome: np.full(len(imagens), np.nan) for nome in METRICAS_GEOMETRICAS
+        }
+    for nome in METRICAS_GEOMETRICAS:
+        colunas[nome] = geometria[nome].astype(np.float32)
+    return IndiceErros(np.array(dados.nomes, dtype=str), rotulos, colunas)
+
+
+if __name__ == "__main__":
+    # python erros.py <anotações> <saídas> <old|new> [dente] [k]
+    anotacao_path, model_path, modelo = sys.argv[1:4]
+    indice = indice_erros(carrega_dados(anotacao_path, model_path), modelo)
+    dentes = sys.argv[4:5] or DENTES
+    k = int(sys.argv[5]) if len(sys.argv) > 5 else 5
+    print(f"{len(indice)} erros")
+    for dente in dentes:
+        indice.mostra(indice.maiores_scores(dente, k=k))
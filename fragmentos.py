@@ -0,0 +1,210 @@
+import sys
+import zlib
+import numpy as np
+
+from conta_dentes import Avaliador
+from dados import (
+    CACHE_DIR,
+    DENTES,
+    Dados,
+    carrega_dados,
+    contagens_regra,
+    contagens_unidades,
+    metricas_unidades,
+    regra,
+)
+from metricas_por_dentes import Avaliador as AvaliadorPorDente
+from monte_carlo import soma_amostras_paralelo
+
+# Faixas de score do histograma (0 a 1), por dente e presença na anotação
+FAIXAS_HISTOGRAMA = 100
+
+
+class Parcial:
+    # Resultado de um fragmento (subconjunto das imagens), combinável com os de
+    # outros fragmentos. Só guarda contagens: nada depende da ordem das imagens.
+    def __init__(self, modelo, nomes, contagens, totais, histograma=None):
+        self.modelo = modelo  # Descrição da regra (repr de dados.Regra)
+        self.nomes = nomes  # (n,) str: nome base de cada imagem, ordenado
+        self.contagens = contagens  # (n, 4) uint8 de contagens_regra
+        self.totais = totais  # (4, 32) int64 com VP, FP, FN e VN por dente
+        # (2, 32, FAIXAS_HISTOGRAMA) int64: scores dos dentes ausentes (0) e
+        # presentes (1) na anotação, ou None
+        self.histograma = histograma
+
+    def __len__(self):
+        return len(self.nomes)
+
+
+def fragmento_dos_nomes(nomes, n_fragmentos):
+    # Fragmento de cada imagem pelo nome base, igual em qualquer máquina
+    return np.array(
+        [zlib.crc32(nome.encode()) % n_fragmentos for nome in nomes], dtype=np.int64
+    )
+
+
+def seleciona(dados, mascara):
+    # Dados apenas das imagens marcadas em mascara
+    return Dados(
+        [nome for nome, m in zip(dados.nomes, mascara) if m],
+        dados.bits_anotacao[mascara],
+        dados.bits_presenca[mascara],
+        dados.score[mascara],
+        None if dados.eixo_anotacao is None else dados.eixo_anotacao[mascara],
+        None if dados.eixo_modelo is None else dados.eixo_modelo[mascara],
+    )
+
+
+def histograma_scores(dados):
+    # Contagem de scores por (presença na anotação, dente, faixa); nan fica de fora
+    faixa = np.clip(
+        (np.nan_to_num(dados.score) * FAIXAS_HISTOGRAMA).astype(np.int64),
+        0,
+        FAIXAS_HISTOGRAMA - 1,
+    )
+    dente = np.broadcast_to(np.arange(len(DENTES)), faixa.shape)
+    indice = (dados.anotacao * len(DENTES) + dente) * FAIXAS_HISTOGRAMA + faixa
+    validos = ~np.isnan(dados.score)
+    return np.bincount(
+        indice[validos], minlength=2 * len(DENTES) * FAIXAS_HISTOGRAMA
+    ).reshape(2, len(DENTES), FAIXAS_HISTOGRAMA)
+
+
+def parcial(dados, modelo="old", histograma=True):
+    contagens = contagens_regra(dados, modelo)
+    return Parcial(
+        repr(regra(modelo)),
+        np.array(dados.nomes, dtype=str),
+        contagens["por_imagem"],
+        contagens["por_dente"],
+        histograma_scores(dados) if histograma else None,
+    )
+
+
+def avalia_fragmento(
+    anotacao_path,
+    model_path,
+    modelo="old",
+    fragmento=None,
+    histograma=True,
+    cache_dir=CACHE_DIR,
+):
+    # Avalia as imagens de um par de pastas. fragmento=(i, n) avalia apenas o
+    # i-ésimo de n fragmentos (por nome), para dividir uma pasta entre máquinas.
+    dados = carrega_dados(anotacao_path, model_path, cache_dir)
+    if fragmento is not None:
+        i, n_fragmentos = fragmento
+        dados = seleciona(dados, fragmento_dos_nomes(dados.nomes, n_fragmentos) == i)
+    return parcial(dados, modelo, histograma)
+
+
+def combina(*parciais):
+    # Combinação associativa e comutativa: imagens reunidas em ordem de nome
+    # (a mesma de carrega_dados) e contagens somadas
+    if not parciais:
+        raise ValueError("Nenhum resultado parcial para combinar")
+    modelos = {p.modelo for p in parciais}
+    if len(modelos) > 1:
+        raise ValueError(f"Resultados parciais de regras diferentes: {modelos}")
+
+    nomes = np.concatenate([p.nomes for p in parciais])
+    ordem = np.argsort(nomes, kind="stable")
+    nomes = nomes[ordem]
+    repetidos = nomes[1:][nomes[1:] == nomes[:-1]]
+    if len(repetidos):
+        raise ValueError(
+            f"Imagens em mais de um fragmento: {', '.join(np.unique(repetidos)[:5])}"
+        )
+
+    histogramas = [p.histograma for p in parciais]
+    return Parcial(
+        parciais[0].modelo,
+        nomes,
+        np.concatenate([p.contagens for p in parciais])[ordem],
+        sum(p.totais for p in parciais),
+        None if any(h is None for h in histogramas) else sum(histogramas),
+    )
+
+
+def salva_parcial(resultado, path):
+    # Arquivo aberto aqui para que np.savez não acrescente a extensão .npz
+    with open(path, "wb") as file:
+        np.savez_compressed(
+            file,
+            modelo=resultado.modelo,
+            nomes=resultado.nomes,
+            contagens=resultado.contagens,
+            totais=resultado.totais,
+            **(
+                {}
+                if resultado.histograma is None
+                else {"histograma": resultado.histograma}
+            ),
+        )
+
+
+def carrega_parcial(path):
+    with np.load(path) as arquivo:
+        return Parcial(
+            str(arquivo["modelo"]),
+            arquivo["nomes"],
+            arquivo["contagens"],
+            arquivo["totais"],
+            arquivo["histograma"] if "histograma" in arquivo.files else None,
+        )
+
+
+def reduz(*paths):
+    return combina(*(carrega_parcial(path) for path in paths))
+
+
+def avaliadores(resultado):
+    # Avaliador geral e por dente preenchidos com as contagens combinadas, para
+    # usar calcula_metricas, mostra_metricas e as visualizações
+    vp, fp, fn, vn = resultado.totais
+    geral = Avaliador()
+    geral.verdadeiros_positivos = int(vp.sum())
+    geral.falsos_positivos = int(fp.sum())
+    geral.falsos_negativos = int(fn.sum())
+    geral.acertos = int(vp.sum() + vn.sum())
+    geral.total_dentes = len(resultado) * len(DENTES)
+
+    por_dente = AvaliadorPorDente()
+    for i, dente in enumerate(por_dente.dentes):
+        por_dente.metricas_por_dente[dente] = {
+            "acertos": int(vp[i] + vn[i]),
+            "verdadeiros_positivos": int(vp[i]),
+            "falsos_positivos": int(fp[i]),
+            "falsos_negativos": int(fn[i]),
+        }
+    return geral, por_dente
+
+
+def monte_carlo_parcial(
+    resultado, num_iteracoes=1000, amostra_tamanho=0.7, seed=None, processos=1
+):
+    # Mesmas distribuições de MonteCarloAvaliador.monte_carlo com a mesma semente
+    contagens = contagens_unidades(resultado.contagens)
+    sample_size = int(len(contagens) * amostra_tamanho)
+    totais = soma_amostras_paralelo(
+        contagens, sample_size, num_iteracoes, seed, processos
+    )
+    metricas = metricas_unidades(totais)
+    return {nome: valores.tolist() for nome, valores in metricas.items()}
+
+
+if __name__ == "__main__":
+    # python fragmentos.py avalia <anotações> <saídas> <old|new> <parcial.npz> [i n]
+    # python fragmentos.py reduz <parcial.npz> ...
+    if sys.argv[1] == "avalia":
+        anotacao_path, model_path, modelo, path = sys.argv[2:6]
+        fragmento = tuple(int(v) for v in sys.argv[6:8]) or None
+        resultado = avalia_fragmento(anotacao_path, model_path, modelo, fragmento)
+        salva_parcial(resultado, path)
+        print(f"{path}: {len(resultado)} imagens")
+    else:
+        resultado = reduz(*sys.argv[2:])
+        geral, por_dente = avaliadores(resultado)
+        print(f"{len(resultado)} imagens em {len(sys.argv) - 2} fragmentos")
+        geral.mostra_metricas()
+        por_dente.mostra_metricas()
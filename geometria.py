@@ -0,0 +1,97 @@
+import numpy as np
+
+from dados import DENTES, matrizes_confusao
+
+METRICAS_GEOMETRICAS = [
+    "erro_angulo",
+    "distancia_extremos",
+    "deslocamento_centro",
+    "razao_comprimento",
+]
+
+
+def erros_eixo(anotado, previsto):
+    # Erros entre segmentos anotados e previstos, ambos (n, 2, 2): [[x, y], [x, y]]
+    va = anotado[:, 1] - anotado[:, 0]
+    vp = previsto[:, 1] - previsto[:, 0]
+    comprimento_a = np.linalg.norm(va, axis=1)
+    comprimento_p = np.linalg.norm(vp, axis=1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Ângulo entre os eixos (sem orientação), em graus entre 0 e 90
+        cosseno = np.abs((va * vp).sum(axis=1)) / (comprimento_a * comprimento_p)
+        erro_angulo = np.degrees(np.arccos(np.clip(cosseno, 0.0, 1.0)))
+
+        # Distância média dos extremos, com a melhor correspondência entre eles
+        direto = np.linalg.norm(anotado - previsto, axis=2).mean(axis=1)
+        invertido = np.linalg.norm(anotado - previsto[:, ::-1], axis=2).mean(axis=1)
+        distancia_extremos = np.minimum(direto, invertido)
+
+        deslocamento_centro = np.linalg.norm(
+            anotado.mean(axis=1) - previsto.mean(axis=1), axis=1
+        )
+        razao_comprimento = comprimento_p / comprimento_a
+
+    return {
+        "erro_angulo": erro_angulo,
+        "distancia_extremos": distancia_extremos,
+        "deslocamento_centro": deslocamento_centro,
+        "razao_comprimento": razao_comprimento,
+    }
+
+
+def pares_geometricos(dados, modelo="old"):
+    # Dentes presentes na anotação e detectados pelo modelo (verdadeiros positivos)
+    vp = matrizes_confusao(dados, modelo)["verdadeiros_positivos"]
+    imagens, dentes = np.nonzero(vp)
+    erros = erros_eixo(
+        dados.eixo_anotacao[imagens, dentes], dados.eixo_modelo[imagens, dentes]
+    )
+
+    # Pares sem geometria válida (segmento degenerado ou ausente) são descartados
+    valido = np.ones(len(imagens), dtype=bool)
+    for valores in erros.values():
+        valido &= np.isfinite(valores)
+    erros = {nome: valores[valido] for nome, valores in erros.items()}
+    return imagens[valido], dentes[valido], erros
+
+
+def avalia_geometria(dados, modelo="old"):
+    # Média e mediana de cada erro geométrico, geral e por dente
+    imagens, dentes, erros = pares_geometricos(dados, modelo)
+    quantidade = np.bincount(dentes, minlength=len(DENTES))
+
+    geral = {"pares": len(imagens)}
+    por_dente = {dente: {"pares": int(quantidade[i])} for i, dente in enumerate(DENTES)}
+    for nome, valores in erros.items():
+        geral[nome] = float(np.mean(valores)) if len(valores) else np.nan
+        geral[f"{nome}_mediana"] = float(np.median(valores)) if len(valores) else np.nan
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            medias = np.bincount(dentes, valores, minlength=len(DENTES)) / quantidade
+
+        # Mediana por dente: ordena por (dente, valor) e pega o meio de cada grupo
+        ordem = np.lexsort((valores, dentes))
+        inicio = np.r_[0, np.cumsum(quantidade)[:-1]]
+        baixo = inicio + (quantidade - 1) // 2
+        alto = inicio + quantidade // 2
+        ordenados = valores[ordem]
+        tem = quantidade > 0
+        medianas = np.full(len(DENTES), np.nan)
+        medianas[tem] = (ordenados[baixo[tem]] + ordenados[alto[tem]]) / 2
+
+        for i, dente in enumerate(DENTES):
+            por_dente[dente][nome] = float(medias[i])
+            por_dente[dente][f"{nome}_mediana"] = float(medianas[i])
+
+    return geral, por_dente
+
+
+def somas_por_imagem(dados, modelo="old"):
+    # (n_imagens, 1 + 4): quantidade de pares e soma de cada erro geométrico,
+    # para que a média de uma amostra seja soma das somas / soma das quantidades
+    imagens, _, erros = pares_geometricos(dados, modelo)
+    colunas = [np.bincount(imagens, minlength=len(dados)).astype(np.float64)]
+    for nome in METRICAS_GEOMETRICAS:
+        colunas.append(np.bincount(imagens, erros[nome], minlength=len(dados)))
+    return np.stack(colunas, axis=1)
@@ -0,0 +1,217 @@
+import os
+import time
+import zipfile
+import numpy as np
+
+from os.path import isfile, join, splitext
+
+from conta_dentes import Avaliador
+from dados import (
+    CONFUSAO,
+    Dados,
+    contagens_regra,
+    linha_anotacao,
+    linha_saida,
+    read_file,
+    regra,
+)
+from pareamento import lista_pasta
+from metricas_por_dentes import Avaliador as AvaliadorPorDente
+
+
+class AvaliadorIncremental(Avaliador):
+    def __init__(self, model_path, modelo="new", estado_path=None, anotacao_path=None):
+        super().__init__()
+        if anotacao_path is not None:
+            self.anotacao_path = anotacao_path
+        self.model_path = model_path
+        self.modelo = modelo
+        self.estado_path = estado_path
+        # Nome base -> (arquivo anotação, arquivo saída, (tamanho, mtime) de cada um)
+        self.arquivos = {}
+        # Nome base -> (4, 32) bool com a contribuição do par em cada contagem
+        self.contribuicoes = {}
+        self.totais = np.zeros((len(CONFUSAO), len(self.dentes)), dtype=np.int64)
+        self.metricas_por_dente = {}
+        # Nome base -> erro dos pares que não puderam ser lidos na última
+        # verificação (arquivo ainda sendo escrito ou malformado)
+        self.pendentes = {}
+        if estado_path and isfile(estado_path):
+            self.carrega_estado()
+        self.sincroniza()
+
+    def contribuicao(self, arquivo_an, arquivo_ot):
+        anotacao, eixo_anotacao = linha_anotacao(
+            read_file(join(self.anotacao_path, arquivo_an))
+        )
+        presenca, score, eixo_modelo = linha_saida(
+            read_file(join(self.model_path, arquivo_ot))
+        )
+        dados = Dados(
+            [splitext(arquivo_ot)[0]],
+            anotacao[None],
+            presenca[None],
+            score[None],
+            eixo_anotacao[None],
+            eixo_modelo[None],
+        )
+        # Contribuição (4, 32) com VP, FP, FN e VN, na ordem de CONFUSAO
+        return contagens_regra(dados, self.modelo)["por_dente"]
+
+    def remove(self, base):
+        del self.arquivos[base]
+        self.totais -= self.contribuicoes.pop(base)
+
+    def adiciona(self, base, arquivo, contribuicao=None):
+        if contribuicao is None:
+            contribuicao = self.contribuicao(arquivo[0], arquivo[1])
+        self.arquivos[base] = arquivo
+        self.contribuicoes[base] = contribuicao
+        self.totais += contribuicao
+
+    def atualiza(self):
+        # Aplica apenas a diferença dos pares novos, alterados ou removidos.
+        # Devolve quantos pares mudaram.
+        atuais = {}
+        for path in (self.anotacao_path, self.model_path):
+            nomes, tamanhos, mtimes = lista_pasta(path)
+            atuais[path] = {
+                splitext(nome)[0]: (str(nome), (int(tamanho), int(mtime)))
+                for nome, tamanho, mtime in zip(nomes, tamanhos, mtimes)
+            }
+        an = atuais[self.anotacao_path]
+        ot = atuais[self.model_path]
+
+        alterados = 0
+        self.pendentes = {}
+        for base in self.arquivos.keys() - (an.keys() & ot.keys()):
+            self.remove(base)
+            alterados += 1
+
+        for base in an.keys() & ot.keys():
+            arquivo = (an[base][0], ot[base][0], an[base][1], ot[base][1])
+            if self.arquivos.get(base) == arquivo:
+                continue
+            try:
+                contribuicao = self.contribuicao(arquivo[0], arquivo[1])
+            except (OSError, ValueError, KeyError, TypeError) as erro:
+                # A contribuição anterior (se houver) é mantida e, como a nova
+                # chave não é registrada, o par é lido de novo na próxima vez
+                self.pendentes[base] = f"{type(erro).__name__}: {erro}"
+                continue
+            if base in self.arquivos:
+                self.remove(base)
+            self.adiciona(base, arquivo, contribuicao)
+            alterados += 1
+
+        if alterados:
+            self.sincroniza()
+        return alterados
+
+    def sincroniza(self):
+        # Atualiza os contadores no formato de conta_dentes e metricas_por_dentes
+        vp, fp, fn, vn = self.totais
+        self.verdadeiros_positivos = int(vp.sum())
+        self.falsos_positivos = int(fp.sum())
+        self.falsos_negativos = int(fn.sum())
+        self.acertos = int(vp.sum() + vn.sum())
+        self.total_dentes = len(self.arquivos) * len(self.dentes)
+        self.metricas_por_dente = {
+            dente: {
+                "acertos": int(vp[i] + vn[i]),
+                "verdadeiros_positivos": int(vp[i]),
+                "falsos_positivos": int(fp[i]),
+                "falsos_negativos": int(fn[i]),
+            }
+            for i, dente in enumerate(self.dentes)
+        }
+
+    def mostra_metricas(self):
+        if self.pendentes:
+            print(f"{len(self.pendentes)} pares aguardando leitura válida")
+        if not self.arquivos:
+            print("Nenhum par avaliado")
+            return
+        super().mostra_metricas()
+
+    def calcula_metricas_por_dente(self):
+        return AvaliadorPorDente.calcula_metricas(self)
+
+    def salva_estado(self, estado_path=None):
+        estado_path = estado_path or self.estado_path
+        bases = sorted(self.arquivos)
+        n = len(bases)
+        # Arquivo aberto aqui para que np.savez não acrescente a extensão .npz.
+        # Gravado ao lado e trocado de uma vez, para nunca deixar um estado pela
+        # metade no lugar do anterior.
+        with open(estado_path + ".tmp", "wb") as file:
+            np.savez(
+                file,
+                anotacao_path=os.path.abspath(self.anotacao_path),
+                model_path=os.path.abspath(self.model_path),
+                modelo=repr(regra(self.modelo)),
+                bases=np.array(bases, dtype=str),
+                arquivos_an=np.array([self.arquivos[b][0] for b in bases], dtype=str),
+                arquivos_ot=np.array([self.arquivos[b][1] for b in bases], dtype=str),
+                chaves=np.array(
+                    [self.arquivos[b][2] + self.arquivos[b][3] for b in bases],
+                    dtype=np.int64,
+                ).reshape(n, 4),
+                contribuicoes=np.array(
+                    [self.contribuicoes[b] for b in bases], dtype=bool
+                ).reshape(n, len(CONFUSAO), len(self.dentes)),
+            )
+        os.replace(estado_path + ".tmp", estado_path)
+
+    def carrega_estado(self, estado_path=None):
+        # Estado ilegível, de outras pastas ou de outra regra de avaliação é
+        # ignorado: os pares são lidos de novo na próxima atualização
+        try:
+            with np.load(estado_path or self.estado_path) as estado:
+                if (
+                    str(estado["anotacao_path"]) != os.path.abspath(self.anotacao_path)
+                    or str(estado["model_path"]) != os.path.abspath(self.model_path)
+                    or str(estado["modelo"]) != repr(regra(self.modelo))
+                ):
+                    return
+                bases = estado["bases"]
+                arquivos_an = estado["arquivos_an"]
+                arquivos_ot = estado["arquivos_ot"]
+                chaves = estado["chaves"]
+                contribuicoes = estado["contribuicoes"]
+        except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+            return
+        self.arquivos = {}
+        self.contribuicoes = {}
+        for base, arquivo_an, arquivo_ot, chave, contribuicao in zip(
+            bases, arquivos_an, arquivos_ot, chaves, contribuicoes
+        ):
+            self.arquivos[str(base)] = (
+                str(arquivo_an),
+                str(arquivo_ot),
+                (int(chave[0]), int(chave[1])),
+                (int(chave[2]), int(chave[3])),
+            )
+            self.contribuicoes[str(base)] = contribuicao
+        self.totais = contribuicoes.sum(axis=0, dtype=np.int64)
+
+    def observa(self, intervalo=5.0, callback=None, max_verificacoes=None):
+        # Verifica as pastas periodicamente e chama callback(self) quando algo muda
+        verificacoes = 0
+        while max_verificacoes is None or verificacoes < max_verificacoes:
+            if self.atualiza():
+                if self.estado_path:
+                    self.salva_estado()
+                if callback:
+                    callback(self)
+            verificacoes += 1
+            if max_verificacoes is None or verificacoes < max_verificacoes:
+                time.sleep(intervalo)
+
+
+if __name__ == "__main__":
+    avaliador = AvaliadorIncremental(
+        "test/output_longaxis_standard/", "new", "estado_incremental.npz"
+    )
+    print("Observando novas saídas do modelo (Ctrl+C para sair)...")
+    avaliador.observa(callback=lambda a: a.mostra_metricas())
@@ -0,0 +1,94 @@
+import sys
+import numpy as np
+
+from clinicas import clinicas
+from dados import (
+    INDICE_DENTE,
+    carrega_dados,
+    contagens_regra,
+    contagens_unidades,
+    metricas_unidades,
+)
+
+# Unidades deixadas de fora, uma de cada vez
+GRUPOS_JACKKNIFE = ["imagem", "clinica"]
+
+
+def contagens_grupos(dados, modelo="old", por="imagem", por_dente=False):
+    # Rótulos e contagens de cada grupo: (g, 5) com acertos, verdadeiros
+    # positivos, falsos positivos, falsos negativos e número de imagens, ou
+    # (g, 32, 4) por dente
+    contagens = contagens_regra(dados, modelo, por_imagem_dente=por_dente)
+    contagens = contagens["por_imagem_dente" if por_dente else "por_imagem"]
+    if por == "imagem":
+        rotulos = np.array(dados.nomes, dtype=str)
+        return rotulos, contagens_unidades(contagens).astype(np.int64)
+    if por == "clinica":
+        rotulos, ids = clinicas(dados.nomes)
+        return rotulos, contagens_unidades(contagens, ids, len(rotulos))
+    raise ValueError(f"Grupo desconhecido: {por} (use {GRUPOS_JACKKNIFE})")
+
+
+def jackknife_contagens(rotulos, contagens, por_dente=False):
+    # Cada estimativa sem um grupo é o total menos as contagens do grupo: uma
+    # subtração vetorizada em vez de uma avaliação completa por grupo
+    total = contagens.sum(axis=0)
+    completo = metricas_unidades(total, por_dente)
+    deixados = metricas_unidades(total - contagens, por_dente)
+
+    g = len(contagens)
+    resultado = {
+        "rotulos": rotulos,
+        "completo": completo,
+        "deixados": deixados,
+        "estimativa": {},
+        "vies": {},
+        "desvio": {},
+        "influencia": {},
+    }
+    for nome, valores in deixados.items():
+        with np.errstate(invalid="ignore"):
+            media = np.nanmean(valores, axis=0) if g else np.nan
+            resultado["vies"][nome] = (g - 1) * (media - completo[nome])
+            resultado["estimativa"][nome] = completo[nome] - resultado["vies"][nome]
+            resultado["desvio"][nome] = np.sqrt(
+                (g - 1) / max(g, 1) * np.nansum((valores - media) ** 2, axis=0)
+            )
+            # Influência empírica de cada grupo: (g - 1) * (completo - sem o grupo)
+            resultado["influencia"][nome] = (g - 1) * (completo[nome] - valores)
+    return resultado
+
+
+def jackknife(dados, modelo="old", por="imagem", por_dente=False):
+    # Estimativas deixando de fora uma imagem ou uma clínica de cada vez, com
+    # viés, desvio padrão e influência de cada grupo, gerais ou (32,) por dente
+    rotulos, contagens = contagens_grupos(dados, modelo, por, por_dente)
+    return jackknife_contagens(rotulos, contagens, por_dente)
+
+
+def mais_influentes(resultado, metrica="f1_score", k=10, dente=None):
+    # Grupos que mais movem a métrica (maior influência em valor absoluto)
+    influencia = resultado["influencia"][metrica]
+    if dente is not None:
+        influencia = influencia[:, INDICE_DENTE[dente]]
+    ordem = np.argsort(-np.abs(np.nan_to_num(influencia)), kind="stable")[:k]
+    return [(str(resultado["rotulos"][i]), float(influencia[i])) for i in ordem]
+
+
+def mostra_jackknife(resultado, k=10):
+    for nome in resultado["completo"]:
+        print(
+            f"{nome}: {float(resultado['completo'][nome]):.4f} "
+            f"(jackknife {float(resultado['estimativa'][nome]):.4f} "
+            f"± {float(resultado['desvio'][nome]):.4f})"
+        )
+    print("\nMaior influência no F1-Score:")
+    for rotulo, influencia in mais_influentes(resultado, k=k):
+        print(f"{rotulo}: {influencia:+.4f}")
+
+
+if __name__ == "__main__":
+    # python jackknife.py <anotações> <saídas> <old|new> [imagem|clinica]
+    anotacao_path, model_path, modelo = sys.argv[1:4]
+    por = sys.argv[4] if len(sys.argv) > 4 else "imagem"
+    mostra_jackknife(jackknife(carrega_dados(anotacao_path, model_path), modelo, por))
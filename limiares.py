@@ -0,0 +1,69 @@
+import numpy as np
+
+from dados import DENTES, metricas_contagens
+
+
+def varredura(score, anotacao):
+    # Contagens e métricas para cada limiar distinto, com a regra score >= limiar.
+    # score e anotacao são vetores do mesmo tamanho; dentes ausentes têm score nan
+    # e nunca são classificados como positivos.
+    score = np.where(np.isnan(score), -np.inf, score)
+    ordem = np.argsort(-score, kind="stable")
+    s = score[ordem]
+    a = anotacao[ordem]
+
+    positivos = int(a.sum())
+    negativos = len(a) - positivos
+
+    # Último elemento de cada grupo de scores iguais (e não ausentes)
+    fim = np.flatnonzero(np.r_[s[1:] != s[:-1], True])
+    fim = fim[np.isfinite(s[fim])]
+
+    vp_acum = np.cumsum(a)
+    fp_acum = np.cumsum(~a)
+
+    # Primeiro ponto: limiar infinito, nenhum positivo
+    limiares = np.r_[np.inf, s[fim]]
+    vp = np.r_[0, vp_acum[fim]]
+    fp = np.r_[0, fp_acum[fim]]
+    fn = positivos - vp
+    vn = negativos - fp
+
+    resultado = {
+        "limiares": limiares,
+        "verdadeiros_positivos": vp,
+        "falsos_positivos": fp,
+        "falsos_negativos": fn,
+        "verdadeiros_negativos": vn,
+    }
+    resultado.update(metricas_contagens(vp + vn, vp, fp, fn, len(a)))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        resultado["taxa_falsos_positivos"] = fp / negativos
+    return resultado
+
+
+def varredura_limiares(dados, por_dente=False):
+    # Curvas de precisão/recall/F1 para todos os limiares do score do modelo antigo
+    if not por_dente:
+        return varredura(dados.score.ravel(), dados.anotacao.ravel())
+    return {
+        dente: varredura(dados.score[:, i], dados.anotacao[:, i])
+        for i, dente in enumerate(DENTES)
+    }
+
+
+def melhor_ponto(resultado):
+    # Ponto de operação com maior F1-score
+    f1_score = np.nan_to_num(resultado["f1_score"], nan=-1.0)
+    i = int(np.argmax(f1_score))
+    return {nome: valores[i].item() for nome, valores in resultado.items()}
+
+
+def melhores_pontos(dados):
+    # Melhor ponto de operação geral e de cada dente
+    geral = melhor_ponto(varredura_limiares(dados))
+    por_dente = {
+        dente: melhor_ponto(resultado)
+        for dente, resultado in varredura_limiares(dados, por_dente=True).items()
+    }
+    return geral, por_dente
@@ -1,9 +1,22 @@
-import json
 import numpy as np
 import matplotlib.pyplot as plt
 
-from os import listdir
-from os.path import isfile, join, splitext
+import perfil
+
+from dados import (
+    INDICE_DENTE,
+    METRICAS,
+    carrega_dados,
+    contagens_regra,
+    gera_dentes,
+    obtem_dados,
+)
+from calibracao import (
+    calibracao,
+    monte_carlo_calibracao,
+    mostra_calibracao,
+    visualiza_calibracao,
+)
 
 
 class Avaliador:
@@ -23,34 +36,7 @@ class Avaliador:
         }
 
     def obtem_dados(self, model_path):
-        # Listar e ordenar arquivos das duas pastas
-        files_folder_output = sorted(
-            [f for f in listdir(model_path) if isfile(join(model_path, f))]
-        )
-        files_folder_anotacao = sorted(
-            [
-                f
-                for f in listdir(self.anotacao_path)
-                if isfile(join(self.anotacao_path, f))
-            ]
-        )
-
-        # Obter conjunto de nomes base (sem extensão) para comparação
-        base_output = {splitext(f)[0] for f in files_folder_output}
-        base_anotacao = {splitext(f)[0] for f in files_folder_anotacao}
-
-        # Manter apenas arquivos com nomes base comuns
-        common_bases = base_output & base_anotacao  # Interseção dos conjuntos
-
-        # Filtrar listas originais para manter apenas arquivos correspondentes
-        files_folder_output = [
-            f for f in files_folder_output if splitext(f)[0] in common_bases
-        ]
-        files_folder_anotacao = [
-            f for f in files_folder_anotacao if splitext(f)[0] in common_bases
-        ]
-
-        return files_folder_anotacao, files_folder_output
+        return obtem_dados(self.anotacao_path, model_path)
 
     def calcula_metricas(self):
         metricas = {}
@@ -92,59 +78,38 @@ class Avaliador:
             )
 
     def avalia_modelo(self, model_path, modelo="old"):
-        files_folder_anotacao, files_folder_output = self.obtem_dados(model_path)
-
-        for file_ot, file_an in zip(files_folder_output, files_folder_anotacao):
-            ot = read_file(model_path + file_ot)
-            an = read_file(self.anotacao_path + file_an)
-
-            for dente in self.dentes:
-                dente_ot = [
-                    entity for entity in ot["entities"] if entity["class_name"] == dente
-                ]
-                dente_an = [entity for entity in an if entity["label"] == dente]
-
-                if modelo == "old":
-                    if dente_ot:
-                        if dente_an:
-                            if dente_ot[0]["score"] > 0.1:
-                                self.metricas_por_dente[dente]["acertos"] += 1
-                                self.metricas_por_dente[dente][
-                                    "verdadeiros_positivos"
-                                ] += 1
-                            elif dente_ot[0]["score"] < 0.1:
-                                self.metricas_por_dente[dente]["falsos_negativos"] += 1
-                        else:
-                            if dente_ot[0]["score"] > 0.1:
-                                self.metricas_por_dente[dente]["falsos_positivos"] += 1
-                            elif dente_ot[0]["score"] < 0.1:
-                                self.metricas_por_dente[dente]["acertos"] += 1
-                else:
-                    if dente_ot:
-                        if dente_an:
-                            self.metricas_por_dente[dente]["acertos"] += 1
-                            self.metricas_por_dente[dente]["verdadeiros_positivos"] += 1
-                        else:
-                            self.metricas_por_dente[dente]["falsos_positivos"] += 1
-                    else:
-                        if dente_an:
-                            self.metricas_por_dente[dente]["falsos_negativos"] += 1
-                        else:
-                            self.metricas_por_dente[dente]["acertos"] += 1
-
-
-def read_file(file_path):
-    with open(file_path, "r") as file:
-        return json.loads(file.read())
-
-
-def gera_dentes():
-    return [
-        f"{quadrante}{posicao}" for quadrante in range(1, 5) for posicao in range(1, 9)
-    ]
-
-
-def visualiza_metricas(avaliador, titulo):
+        dados = carrega_dados(self.anotacao_path, model_path)
+        self.acumula(contagens_regra(dados, modelo))
+
+    def acumula(self, contagens):
+        # contagens: resultado de contagens_regra, já somado por dente
+        with perfil.etapa("agregacao"):
+            vp, fp, fn, vn = contagens["por_dente"]
+
+            for i, dente in enumerate(self.dentes):
+                self.metricas_por_dente[dente]["acertos"] += int(vp[i] + vn[i])
+                self.metricas_por_dente[dente]["verdadeiros_positivos"] += int(vp[i])
+                self.metricas_por_dente[dente]["falsos_positivos"] += int(fp[i])
+                self.metricas_por_dente[dente]["falsos_negativos"] += int(fn[i])
+
+
+def barras_de_erro(metricas, dentes, intervalos, nome):
+    # Distâncias até os limites do intervalo (2, 32, 5) no formato de yerr
+    if intervalos is None:
+        return None
+    i = METRICAS.index(nome)
+    valores = np.array([metricas[dente][nome] for dente in dentes])
+    linhas = [INDICE_DENTE[dente] for dente in dentes]
+    inferior = intervalos[0, linhas, i]
+    superior = intervalos[1, linhas, i]
+    return np.nan_to_num(
+        np.clip([valores - inferior, superior - valores], 0, None), nan=0.0
+    )
+
+
+def visualiza_metricas(avaliador, titulo, intervalos=None):
+    # intervalos: (2, 32, 5) com limites inferior e superior de cada métrica por
+    # dente (por exemplo, intervalos_confianca de monte_carlo_por_dente)
     metricas = avaliador.calcula_metricas()
     dentes = list(metricas.keys())
 
@@ -154,15 +119,18 @@ def visualiza_metricas(avaliador, titulo):
     recall = [m["recall"] for m in metricas.values()]
     f1_score = [m["f1_score"] for m in metricas.values()]
 
+    def yerr(nome):
+        return barras_de_erro(metricas, dentes, intervalos, nome)
+
     x = np.arange(len(dentes))  # Índices para os dentes
     width = 0.2  # Largura das barras
 
     fig, axs = plt.subplots(2, 1, figsize=(12, 10))
 
     # Gráfico de Precisão, Recall e F1-Score
-    axs[0].bar(x - width, precisao, width, label="Precisão")
-    axs[0].bar(x, recall, width, label="Recall")
-    axs[0].bar(x + width, f1_score, width, label="F1-Score")
+    axs[0].bar(x - width, precisao, width, yerr=yerr("precisao"), label="Precisão")
+    axs[0].bar(x, recall, width, yerr=yerr("recall"), label="Recall")
+    axs[0].bar(x + width, f1_score, width, yerr=yerr("f1_score"), label="F1-Score")
     axs[0].set_ylabel("Valor")
     axs[0].set_title(f"Métricas por dente - {titulo}")
     axs[0].set_xticks(x)
@@ -170,8 +138,15 @@ def visualiza_metricas(avaliador, titulo):
     axs[0].legend()
 
     # Gráfico de Erro e Acurácia
-    axs[1].bar(x - width / 2, erro, width, label="Erro", color="red")
-    axs[1].bar(x + width / 2, acuracia, width, label="Acurácia", color="green")
+    axs[1].bar(x - width / 2, erro, width, yerr=yerr("erro"), label="Erro", color="red")
+    axs[1].bar(
+        x + width / 2,
+        acuracia,
+        width,
+        yerr=yerr("acuracia"),
+        label="Acurácia",
+        color="green",
+    )
     axs[1].set_ylabel("Valor")
     axs[1].set_title(f"Erro e Acurácia por dente - {titulo}")
     axs[1].set_xticks(x)
@@ -183,14 +158,33 @@ def visualiza_metricas(avaliador, titulo):
 
 
 if __name__ == "__main__":
+    perfil.ativa_pela_linha_de_comando()
+
     print("------------- OLD Model ---------------")
     old = Avaliador()
     old.avalia_modelo(old.old_model_path)
     old.mostra_metricas()
-    visualiza_metricas(old, "Modelo Antigo")
+    with perfil.etapa("grafico"):
+        visualiza_metricas(old, "Modelo Antigo")
+
+    # Calibração do score do modelo antigo, com intervalos por bootstrap
+    dados_old = carrega_dados(old.anotacao_path, old.old_model_path)
+    calibracao_old = calibracao(dados_old)
+    mostra_calibracao(calibracao_old)
+    intervalos_calibracao = monte_carlo_calibracao(dados_old, bootstrap=True)[
+        "intervalos"
+    ]
+    with perfil.etapa("grafico"):
+        visualiza_calibracao(calibracao_old, "Modelo Antigo", intervalos_calibracao)
 
     print("\n------------- NEW Model ---------------")
     new = Avaliador()
     new.avalia_modelo(new.new_model_path, "new")
     new.mostra_metricas()
-    visualiza_metricas(new, "Modelo Novo")
+    with perfil.etapa("grafico"):
+        visualiza_metricas(new, "Modelo Novo")
+
+    perfil.mostra_relatorio()
+    perfil.salva_relatorio(
+        metricas={"old": old.calcula_metricas(), "new": new.calcula_metricas()}
+    )
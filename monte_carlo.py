@@ -1,10 +1,30 @@
-import json
-import random
+import os
+import sys
+import warnings
 import numpy as np
 import matplotlib.pyplot as plt
 
-from os import listdir
-from os.path import isfile, join, splitext
+import perfil
+
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from statistics import NormalDist
+
+from dados import (
+    METRICAS,
+    carrega_dados,
+    contagens_regra,
+    contagens_unidades,
+    gera_dentes,
+    metricas_unidades,
+    obtem_dados,
+    regra,
+    soma_por_grupo,
+)
+from cache_resultados import CACHE_RESULTADOS, memoriza
+from clinicas import clinicas
+from geometria import METRICAS_GEOMETRICAS, somas_por_imagem
+from jackknife import jackknife
 
 
 class Avaliador:
@@ -20,34 +40,7 @@ class Avaliador:
         self.dentes = gera_dentes()
 
     def obtem_dados(self, model_path):
-        # Listar e ordenar arquivos das duas pastas
-        files_folder_output = sorted(
-            [f for f in listdir(model_path) if isfile(join(model_path, f))]
-        )
-        files_folder_anotacao = sorted(
-            [
-                f
-                for f in listdir(self.anotacao_path)
-                if isfile(join(self.anotacao_path, f))
-            ]
-        )
-
-        # Obter conjunto de nomes base (sem extensão) para comparação
-        base_output = {splitext(f)[0] for f in files_folder_output}
-        base_anotacao = {splitext(f)[0] for f in files_folder_anotacao}
-
-        # Manter apenas arquivos com nomes base comuns
-        common_bases = base_output & base_anotacao  # Interseção dos conjuntos
-
-        # Filtrar listas originais para manter apenas arquivos correspondentes
-        files_folder_output = [
-            f for f in files_folder_output if splitext(f)[0] in common_bases
-        ]
-        files_folder_anotacao = [
-            f for f in files_folder_anotacao if splitext(f)[0] in common_bases
-        ]
-
-        return files_folder_anotacao, files_folder_output
+        return obtem_dados(self.anotacao_path, model_path)
 
     def calcula_metricas(self):
         # Cálculo do erro: Proporção de exemplos classificados incorretamente
@@ -73,103 +66,562 @@ class Avaliador:
 
 
 class MonteCarloAvaliador(Avaliador):
-    def __init__(self, num_iteracoes=1000, amostra_tamanho=0.7):
+    def __init__(
+        self,
+        num_iteracoes=1000,
+        amostra_tamanho=0.7,
+        processos=1,
+        cache_resultados=None,
+    ):
         super().__init__()
         self.num_iteracoes = num_iteracoes
         self.amostra_tamanho = amostra_tamanho  # Proporção de dados usados por iteração
+        self.processos = processos  # Processos em paralelo (None: todos os núcleos)
+        # Pasta do cache de resultados (cache_resultados.py); usado só com seed
+        self.cache_resultados = cache_resultados
+
+    def pasta_e_regra(self, modelo):
+        # modelo: (pasta de saída, regra), como em monte_carlo_pareado, ou os nomes
+        # "old" e "new", que usam as pastas do avaliador. Outras regras precisam
+        # da pasta, para não serem avaliadas na saída de outro modelo.
+        if isinstance(modelo, tuple):
+            return modelo
+        if isinstance(modelo, str) and modelo in ("old", "new"):
+            pasta = self.old_model_path if modelo == "old" else self.new_model_path
+            return pasta, modelo
+        raise ValueError(
+            f"Informe o modelo como (pasta de saída, regra): {modelo!r} "
+            "não indica a pasta"
+        )
 
-    def monte_carlo(self, modelo="old"):
-        metricas = {
-            "erro": [],
-            "acuracia": [],
-            "precisao": [],
-            "recall": [],
-            "f1_score": [],
-        }
+    def resultado_em_cache(self, tipo, model_path, calcula, seed, **parametros):
+        # Resultado em cache para os mesmos arquivos e parâmetros. Sem semente o
+        # resultado é aleatório e não é guardado.
+        if not self.cache_resultados or seed is None:
+            return calcula()
+        return memoriza(
+            tipo,
+            self.anotacao_path,
+            model_path,
+            calcula,
+            self.cache_resultados,
+            amostra_tamanho=self.amostra_tamanho,
+            num_iteracoes=self.num_iteracoes,
+            seed=seed,
+            **parametros,
+        )
 
+    def monte_carlo(
+        self,
+        modelo="old",
+        seed=None,
+        geometria=False,
+        por_clinica=False,
+        bootstrap=False,
+    ):
         # Obter dados apropriados para o modelo
-        model_path = self.old_model_path if modelo == "old" else self.new_model_path
-        files_folder_anotacao, files_folder_output = self.obtem_dados(model_path)
-
-        for _ in range(self.num_iteracoes):
-            # Resetar contadores
-            self.acertos = 0
-            self.falsos_positivos = 0
-            self.verdadeiros_positivos = 0
-            self.falsos_negativos = 0
-            self.total_dentes = 0
-
-            # Amostragem aleatória
-            sample_size = int(len(files_folder_anotacao) * self.amostra_tamanho)
-            sample_indices = random.sample(
-                range(len(files_folder_anotacao)), sample_size
-            )
-            sampled_files_anotacao = [files_folder_anotacao[i] for i in sample_indices]
-            sampled_files_output = [files_folder_output[i] for i in sample_indices]
-
-            for file_ot, file_an in zip(sampled_files_output, sampled_files_anotacao):
-                ot = read_file(model_path + file_ot)
-                an = read_file(self.anotacao_path + file_an)
-
-                self.total_dentes += 32
-
-                for dente in self.dentes:
-                    dente_ot = [
-                        entity
-                        for entity in ot["entities"]
-                        if entity["class_name"] == dente
-                    ]
-                    dente_an = [entity for entity in an if entity["label"] == dente]
-
-                    if modelo == "old":
-                        if dente_ot:
-                            if dente_an:
-                                if dente_ot[0]["score"] > 0.1:
-                                    self.acertos += 1
-                                    self.verdadeiros_positivos += 1
-                                elif dente_ot[0]["score"] < 0.1:
-                                    self.falsos_negativos += 1
-                            else:
-                                if dente_ot[0]["score"] > 0.1:
-                                    self.falsos_positivos += 1
-                                elif dente_ot[0]["score"] < 0.1:
-                                    self.acertos += 1
-                    else:
-                        if dente_ot:
-                            if dente_an:
-                                self.acertos += 1
-                                self.verdadeiros_positivos += 1
-                            else:
-                                self.falsos_positivos += 1
-                        else:
-                            if dente_an:
-                                self.falsos_negativos += 1
-                            else:
-                                self.acertos += 1
-
-            # Calcular métricas para a amostra
-            erro, acuracia, precisao, recall, f1_score = self.calcula_metricas()
-            metricas["erro"].append(erro)
-            metricas["acuracia"].append(acuracia)
-            metricas["precisao"].append(precisao)
-            metricas["recall"].append(recall)
-            metricas["f1_score"].append(f1_score)
+        model_path, modelo = self.pasta_e_regra(modelo)
+        metricas = self.resultado_em_cache(
+            "monte_carlo",
+            model_path,
+            lambda: self.calcula_monte_carlo(
+                model_path, modelo, seed, geometria, por_clinica, bootstrap
+            ),
+            seed,
+            modelo=repr(regra(modelo)),
+            geometria=geometria,
+            por_clinica=por_clinica,
+            bootstrap=bootstrap,
+        )
 
+        # Contadores da instância ficam com a última iteração, como antes
+        metricas = dict(metricas)
+        ultima = metricas.pop("ultima")
+        if len(ultima):
+            (
+                self.acertos,
+                self.verdadeiros_positivos,
+                self.falsos_positivos,
+                self.falsos_negativos,
+                self.total_dentes,
+            ) = (int(v) for v in ultima)
+
+        return {nome: valores.tolist() for nome, valores in metricas.items()}
+
+    def calcula_monte_carlo(
+        self, model_path, modelo, seed, geometria, por_clinica, bootstrap=False
+    ):
+        # {métrica: (num_iteracoes,)} e "ultima": contagens da última iteração
+        dados = carrega_dados(self.anotacao_path, model_path)
+
+        # Contagens por imagem, calculadas uma única vez. No modo por clínica as
+        # unidades sorteadas são as clínicas, e a última coluna guarda o número
+        # de imagens de cada uma. Sem bootstrap cada amostra tem amostra_tamanho
+        # das unidades, sem reposição, e a dispersão é menor que a do conjunto
+        # completo. bootstrap=True sorteia tantas unidades quantas existem, com
+        # reposição (com por_clinica, bootstrap por conglomerado: o número de
+        # imagens de cada amostra varia com as clínicas sorteadas).
+        contagens = contagens_regra(dados, modelo)["por_imagem"]
+        if por_clinica:
+            rotulos, ids = clinicas(dados.nomes)
+            contagens = contagens_unidades(contagens, ids, len(rotulos))
+        else:
+            contagens = contagens_unidades(contagens)
+        if bootstrap:
+            sample_size = len(contagens)
+        else:
+            sample_size = int(len(contagens) * self.amostra_tamanho)
+        if seed is None:
+            # Semente sorteada uma vez para que todas as somas usem as mesmas amostras
+            seed = np.random.SeedSequence().entropy
+
+        # Todas as iterações de uma vez: (num_iteracoes, 5)
+        totais = soma_amostras_paralelo(
+            contagens,
+            sample_size,
+            self.num_iteracoes,
+            seed,
+            self.processos,
+            reposicao=bootstrap,
+        )
+        metricas = metricas_unidades(totais)
+        total = totais[:, 4] * len(self.dentes)
+        metricas["ultima"] = np.column_stack([totais[:, :4], total])[-1:].ravel()
+
+        if geometria:
+            # Mesma semente: as amostras de imagens são as mesmas das contagens
+            somas = somas_por_imagem(dados, modelo)
+            if por_clinica:
+                somas = soma_por_grupo(somas, ids, len(rotulos))
+            somas = soma_amostras_paralelo(
+                somas,
+                sample_size,
+                self.num_iteracoes,
+                seed,
+                self.processos,
+                reposicao=bootstrap,
+            )
+            with np.errstate(divide="ignore", invalid="ignore"):
+                for i, nome in enumerate(METRICAS_GEOMETRICAS, start=1):
+                    metricas[nome] = somas[:, i] / somas[:, 0]
         return metricas
 
+    def monte_carlo_adaptativo(
+        self,
+        modelo="old",
+        tolerancia=0.001,
+        nivel=0.95,
+        max_iteracoes=100_000,
+        seed=None,
+        guarda_amostras=True,
+    ):
+        # Executa lotes de iterações até que, para todas as métricas, a meia
+        # largura do intervalo de confiança da média (erro de Monte Carlo) e a
+        # variação dos limites do intervalo percentil desde o lote anterior
+        # fiquem abaixo de tolerancia, ou até max_iteracoes. Com a mesma semente,
+        # as amostras são as mesmas de monte_carlo com o número de iterações usado.
+        # guarda_amostras=False mantém só estatísticas acumuladas (memória
+        # constante) e os intervalos vêm de um histograma das métricas.
+        model_path, modelo = self.pasta_e_regra(modelo)
+        dados = carrega_dados(self.anotacao_path, model_path)
+        contagens = contagens_unidades(contagens_regra(dados, modelo)["por_imagem"])
+        sample_size = int(len(dados) * self.amostra_tamanho)
+        if seed is None:
+            seed = np.random.SeedSequence().entropy
+
+        estatisticas = EstatisticasStreaming(METRICAS)
+        amostras = {nome: [] for nome in METRICAS}
+        z = NormalDist().inv_cdf((1 + nivel) / 2)
+        iteracoes = 0
+        intervalos = None
+        convergiu = False
+        while iteracoes < max_iteracoes and not convergiu:
+            lote = min(BLOCOS_POR_LOTE * ITERACOES_POR_BLOCO, max_iteracoes - iteracoes)
+            totais = soma_amostras_paralelo(
+                contagens,
+                sample_size,
+                lote,
+                seed,
+                self.processos,
+                primeiro_bloco=iteracoes // ITERACOES_POR_BLOCO,
+            )
+            metricas = metricas_unidades(totais)
+            estatisticas.atualiza(metricas)
+            if guarda_amostras:
+                for nome, valores in metricas.items():
+                    amostras[nome].append(valores)
+            iteracoes += lote
+
+            anteriores = intervalos
+            if guarda_amostras:
+                intervalos = {
+                    nome: intervalos_confianca(np.concatenate(valores), nivel)
+                    for nome, valores in amostras.items()
+                }
+            else:
+                intervalos = estatisticas.intervalos(nivel)
+            meia_largura = {
+                nome: float(z * desvio / np.sqrt(estatisticas.n[nome]))
+                for nome, desvio in estatisticas.desvios().items()
+            }
+            convergiu = anteriores is not None and all(
+                meia_largura[nome] <= tolerancia
+                and np.all(np.abs(intervalos[nome] - anteriores[nome]) <= tolerancia)
+                for nome in METRICAS
+            )
+
+        resultado = {
+            "iteracoes": iteracoes,
+            "convergiu": convergiu,
+            "medias": estatisticas.medias(),
+            "desvios": estatisticas.desvios(),
+            "meia_largura": meia_largura,
+            "intervalos": {nome: tuple(v.tolist()) for nome, v in intervalos.items()},
+        }
+        if guarda_amostras:
+            resultado["metricas"] = {
+                nome: np.concatenate(valores).tolist()
+                for nome, valores in amostras.items()
+            }
+        return resultado
+
+    def monte_carlo_por_dente(self, modelo="old", seed=None):
+        # (num_iteracoes, 32, 5) com erro, acurácia, precisão, recall e F1 por dente.
+        # Com a mesma semente, as amostras são as mesmas de monte_carlo.
+        model_path, modelo = self.pasta_e_regra(modelo)
+        return self.resultado_em_cache(
+            "monte_carlo_por_dente",
+            model_path,
+            lambda: {
+                "metricas": self.calcula_monte_carlo_por_dente(model_path, modelo, seed)
+            },
+            seed,
+            modelo=repr(regra(modelo)),
+        )["metricas"]
+
+    def calcula_monte_carlo_por_dente(self, model_path, modelo, seed):
+        dados = carrega_dados(self.anotacao_path, model_path)
+
+        contagens = contagens_regra(dados, modelo, por_imagem_dente=True)[
+            "por_imagem_dente"
+        ]
+        sample_size = int(len(dados) * self.amostra_tamanho)
+
+        # (num_iteracoes, 32, 4): acertos, verdadeiros positivos, falsos positivos e
+        # falsos negativos de cada dente na amostra
+        totais = soma_amostras_paralelo(
+            contagens, sample_size, self.num_iteracoes, seed, self.processos
+        )
+        metricas = metricas_unidades(totais, por_dente=True)
+        return np.stack([metricas[nome] for nome in METRICAS], axis=-1)
+
+    def jackknife(self, modelo="old", por="imagem", por_dente=False):
+        # Alternativa determinística às amostras de 70%: deixa de fora uma imagem
+        # ou uma clínica de cada vez (jackknife.py)
+        model_path, modelo = self.pasta_e_regra(modelo)
+        dados = carrega_dados(self.anotacao_path, model_path)
+        return jackknife(dados, modelo, por, por_dente)
+
+    def monte_carlo_pareado(
+        self,
+        modelo_a=None,
+        modelo_b=None,
+        seed=None,
+        por_dente=False,
+        nivel=0.95,
+        bootstrap=True,
+    ):
+        # Bootstrap pareado: as mesmas amostras de imagens são aplicadas aos dois
+        # modelos, dados como em pasta_e_regra. Padrão: antigo x novo.
+        # Cada amostra tem n imagens sorteadas com reposição, então intervalos e
+        # p-valores descrevem a diferença das métricas no conjunto completo.
+        # bootstrap=False usa as subamostras sem reposição de amostra_tamanho
+        # (as de monte_carlo), que variam menos que o conjunto completo.
+        modelo_a = self.pasta_e_regra(modelo_a or "old")
+        modelo_b = self.pasta_e_regra(modelo_b or "new")
+        dados_a = carrega_dados(self.anotacao_path, modelo_a[0])
+        dados_b = carrega_dados(self.anotacao_path, modelo_b[0])
+
+        # Apenas imagens presentes nas saídas dos dois modelos
+        _, linhas_a, linhas_b = np.intersect1d(
+            dados_a.nomes, dados_b.nomes, return_indices=True
+        )
+        contagem = "por_imagem_dente" if por_dente else "por_imagem"
+        contagens = np.stack(
+            [
+                contagens_unidades(
+                    contagens_regra(dados, modelo, por_dente)[contagem][linhas]
+                )
+                for dados, (_, modelo), linhas in (
+                    (dados_a, modelo_a, linhas_a),
+                    (dados_b, modelo_b, linhas_b),
+                )
+            ],
+            axis=1,
+        )
+        if bootstrap:
+            sample_size = len(contagens)
+        else:
+            sample_size = int(len(contagens) * self.amostra_tamanho)
+
+        # (num_iteracoes, 2, 5) ou (num_iteracoes, 2, 32, 4): uma única matriz
+        # de índices para os dois
+        totais = soma_amostras_paralelo(
+            contagens,
+            sample_size,
+            self.num_iteracoes,
+            seed,
+            self.processos,
+            reposicao=bootstrap,
+        )
+        metricas = metricas_unidades(totais, por_dente)
+
+        diferencas = {nome: m[:, 1] - m[:, 0] for nome, m in metricas.items()}
+        p_valores = {nome: p_valor(d) for nome, d in diferencas.items()}
+        return {
+            "a": {nome: m[:, 0] for nome, m in metricas.items()},
+            "b": {nome: m[:, 1] for nome, m in metricas.items()},
+            "diferencas": diferencas,
+            "intervalos": {
+                nome: intervalos_confianca(d, nivel) for nome, d in diferencas.items()
+            },
+            "p_valores": p_valores,
+        }
+
+
+def p_valor(diferencas):
+    # p-valor bilateral da hipótese "sem diferença": fração (com correção +1) das
+    # iterações do lado oposto de zero, ignorando iterações com nan
+    validas = (~np.isnan(diferencas)).sum(axis=0)
+    menores = (diferencas <= 0).sum(axis=0)
+    maiores = (diferencas >= 0).sum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        p = 2 * (np.minimum(menores, maiores) + 1) / (validas + 1)
+    return np.minimum(p, 1.0)
+
+
+def intervalos_confianca(distribuicao, nivel=0.95):
+    # Percentis (inferior, superior) ao longo das iterações (eixo 0), ignorando nan
+    alfa = (1 - nivel) / 2 * 100
+    with warnings.catch_warnings():
+        # Dentes sem nenhuma amostra válida ficam com intervalo nan
+        warnings.simplefilter("ignore", RuntimeWarning)
+        return np.nanpercentile(distribuicao, [alfa, 100 - alfa], axis=0)
+
+
+class EstatisticasStreaming:
+    # Média e variância (combinação de Chan et al.) e histograma de cada métrica,
+    # atualizados lote a lote sem guardar as iterações. As métricas estão em
+    # [0, 1]; os quantis têm resolução 1 / faixas. Iterações com nan são ignoradas.
+    def __init__(self, nomes, faixas=2**14):
+        self.faixas = faixas
+        self.n = {nome: 0 for nome in nomes}
+        self.media = {nome: 0.0 for nome in nomes}
+        self.m2 = {nome: 0.0 for nome in nomes}
+        self.histograma = {nome: np.zeros(faixas, dtype=np.int64) for nome in nomes}
+
+    def atualiza(self, metricas):
+        for nome, valores in metricas.items():
+            valores = valores[~np.isnan(valores)]
+            if not len(valores):
+                continue
+            n_lote = len(valores)
+            media_lote = valores.mean()
+            n = self.n[nome] + n_lote
+            delta = media_lote - self.media[nome]
+            self.m2[nome] += ((valores - media_lote) ** 2).sum() + delta**2 * self.n[
+                nome
+            ] * n_lote / n
+            self.media[nome] += delta * n_lote / n
+            self.n[nome] = n
+            faixa = np.clip(
+                (valores * self.faixas).astype(np.int64), 0, self.faixas - 1
+            )
+            self.histograma[nome] += np.bincount(faixa, minlength=self.faixas)
+
+    def medias(self):
+        return {
+            nome: float(m) if self.n[nome] else np.nan for nome, m in self.media.items()
+        }
+
+    def desvios(self):
+        return {
+            nome: (
+                float(np.sqrt(m2 / (self.n[nome] - 1))) if self.n[nome] > 1 else np.nan
+            )
+            for nome, m2 in self.m2.items()
+        }
+
+    def quantis(self, nome, q):
+        # Centro da faixa que contém cada quantil q (array em [0, 1])
+        if not self.n[nome]:
+            return np.full(len(q), np.nan)
+        acumulado = np.cumsum(self.histograma[nome])
+        faixa = np.searchsorted(acumulado, np.asarray(q) * self.n[nome])
+        return (np.minimum(faixa, self.faixas - 1) + 0.5) / self.faixas
+
+    def intervalos(self, nivel=0.95):
+        alfa = (1 - nivel) / 2
+        return {nome: self.quantis(nome, [alfa, 1 - alfa]) for nome in self.n}
+
+
+# Elementos (iterações × imagens) sorteados por lote, para limitar a memória
+TAMANHO_LOTE = 2**22
+
+
+def sorteia_amostras(rng, n, sample_size, iteracoes, reposicao=False):
+    # Matriz (iteracoes, sample_size) de índices em cada linha. Sem reposição:
+    # posições das sample_size menores chaves de uma matriz aleatória. Com
+    # reposição (bootstrap): sorteios independentes entre 0 e n - 1.
+    if sample_size == 0:
+        return np.empty((iteracoes, 0), dtype=np.intp)
+    if reposicao:
+        return rng.integers(0, n, size=(iteracoes, sample_size))
+    chaves = rng.random((iteracoes, n))
+    return np.argpartition(chaves, sample_size - 1, axis=1)[:, :sample_size]
+
 
-def read_file(file_path):
-    with open(file_path, "r") as file:
-        data = json.loads(file.read())
-    return data
+# Acima deste número de colunas por imagem a soma é feita com multiplicação de
+# matrizes (máscara das amostras × contagens) em vez de gather-and-sum
+COLUNAS_MATRIZ = 16
 
 
-def gera_dentes():
-    dentes = []
-    for quadrante in range(1, 5):  # Quadrantes 1 a 4
-        for posicao in range(1, 9):  # Posições 1 a 8
-            dentes.append(f"{quadrante}{posicao}")
-    return dentes
+def tipo_soma(contagens):
+    return np.float64 if np.issubdtype(contagens.dtype, np.floating) else np.int64
+
+
+def soma_amostras(contagens, rng, sample_size, iteracoes, reposicao=False):
+    # Soma das contagens por imagem de cada amostra: (iteracoes, *contagens.shape[1:])
+    n = len(contagens)
+    planas = contagens.reshape(n, -1)
+    lote = max(1, TAMANHO_LOTE // max(n, 1))
+    dtype = tipo_soma(contagens)
+    totais = np.empty((iteracoes, planas.shape[1]), dtype=dtype)
+
+    if planas.shape[1] > COLUNAS_MATRIZ:
+        # float32 é exato para inteiros até 2**24
+        exato = (
+            dtype == np.int64
+            and max(n, sample_size) * int(planas.max(initial=0)) < 2**24
+        )
+        matriz = planas.astype(np.float32 if exato else np.float64)
+
+    for inicio in range(0, iteracoes, lote):
+        fim = min(inicio + lote, iteracoes)
+        indices = sorteia_amostras(rng, n, sample_size, fim - inicio, reposicao)
+        if planas.shape[1] > COLUNAS_MATRIZ:
+            # Número de vezes que cada imagem foi sorteada em cada iteração
+            linhas = np.arange(fim - inicio)[:, None] * n
+            mascara = (
+                np.bincount((linhas + indices).ravel(), minlength=(fim - inicio) * n)
+                .reshape(fim - inicio, n)
+                .astype(matriz.dtype)
+            )
+            totais[inicio:fim] = mascara @ matriz
+        else:
+            totais[inicio:fim] = planas[indices].sum(axis=1, dtype=dtype)
+    return totais.reshape(iteracoes, *contagens.shape[1:])
+
+
+# Iterações por bloco. Cada bloco tem sua própria semente derivada da semente
+# principal, então o resultado não depende de quantos processos são usados.
+ITERACOES_POR_BLOCO = 1024
+# Blocos por lote do Monte Carlo adaptativo. Fixo, para que o ponto de parada
+# (e as amostras devolvidas) não dependa do número de processos, que apenas
+# dividem os blocos de cada lote.
+BLOCOS_POR_LOTE = 4
+
+
+def blocos_iteracoes(num_iteracoes, seed=None, primeiro_bloco=0):
+    # primeiro_bloco > 0 continua uma execução anterior com a mesma semente: os
+    # blocos são os mesmos de SeedSequence(seed).spawn, a partir desse índice
+    n_blocos = -(-num_iteracoes // ITERACOES_POR_BLOCO)
+    raiz = np.random.SeedSequence(seed)
+    sementes = [
+        np.random.SeedSequence(raiz.entropy, spawn_key=(primeiro_bloco + i,))
+        for i in range(n_blocos)
+    ]
+    return [
+        (min(ITERACOES_POR_BLOCO, num_iteracoes - i * ITERACOES_POR_BLOCO), semente)
+        for i, semente in enumerate(sementes)
+    ]
+
+
+# Contagens compartilhadas com os processos filhos (somente leitura)
+_memoria_worker = None
+_contagens_worker = None
+
+
+def _inicia_worker(nome, forma, dtype):
+    global _memoria_worker, _contagens_worker
+    _memoria_worker = shared_memory.SharedMemory(name=nome)
+    _contagens_worker = np.ndarray(forma, dtype=dtype, buffer=_memoria_worker.buf)
+
+
+def _executa_bloco(args):
+    iteracoes, semente, sample_size, reposicao = args
+    rng = np.random.default_rng(semente)
+    return soma_amostras(_contagens_worker, rng, sample_size, iteracoes, reposicao)
+
+
+def soma_amostras_paralelo(
+    contagens,
+    sample_size,
+    num_iteracoes,
+    seed=None,
+    processos=1,
+    primeiro_bloco=0,
+    reposicao=False,
+):
+    perfil.conta("iteracoes_bootstrap", num_iteracoes)
+    with perfil.etapa("bootstrap"):
+        blocos = blocos_iteracoes(num_iteracoes, seed, primeiro_bloco)
+        processos = min(processos or os.cpu_count() or 1, max(len(blocos), 1))
+
+        if processos <= 1:
+            partes = [
+                soma_amostras(
+                    contagens,
+                    np.random.default_rng(semente),
+                    sample_size,
+                    it,
+                    reposicao,
+                )
+                for it, semente in blocos
+            ]
+        else:
+            # As contagens vão para memória compartilhada em vez de serem serializadas
+            memoria = shared_memory.SharedMemory(
+                create=True, size=max(contagens.nbytes, 1)
+            )
+            try:
+                compartilhado = np.ndarray(
+                    contagens.shape, dtype=contagens.dtype, buffer=memoria.buf
+                )
+                compartilhado[:] = contagens
+                with ProcessPoolExecutor(
+                    max_workers=processos,
+                    initializer=_inicia_worker,
+                    initargs=(memoria.name, contagens.shape, contagens.dtype.str),
+                ) as executor:
+                    # map devolve os blocos na ordem em que foram enviados
+                    partes = list(
+                        executor.map(
+                            _executa_bloco,
+                            [
+                                (it, semente, sample_size, reposicao)
+                                for it, semente in blocos
+                            ],
+                        )
+                    )
+                del compartilhado
+            finally:
+                memoria.close()
+                memoria.unlink()
+
+        if not partes:
+            return np.empty((0, *contagens.shape[1:]), dtype=tipo_soma(contagens))
+        return np.concatenate(partes)
 
 
 def visualiza_modelos(old, new):
@@ -211,7 +663,8 @@ def visualiza_modelos(old, new):
 
 
 def visualiza_distribuicoes(metricas):
-    fig, axs = plt.subplots(2, 3, figsize=(15, 10))
+    linhas = max(2, -(-len(metricas) // 3))
+    fig, axs = plt.subplots(linhas, 3, figsize=(15, 5 * linhas))
     axs = axs.ravel()
     metricas_nomes = list(metricas.keys())
 
@@ -228,12 +681,27 @@ def visualiza_distribuicoes(metricas):
 
 
 if __name__ == "__main__":
+    perfil.ativa_pela_linha_de_comando()
+    # --cache: semente fixa e resultados reaproveitados enquanto nada mudar
+    cache = CACHE_RESULTADOS if "--cache" in sys.argv else None
+    seed = 0 if cache else None
+
     print("------------- Monte Carlo: OLD Model ---------------")
-    old_mc = MonteCarloAvaliador()
-    metricas_old = old_mc.monte_carlo(modelo="old")
-    visualiza_distribuicoes(metricas_old)
+    old_mc = MonteCarloAvaliador(cache_resultados=cache)
+    metricas_old = old_mc.monte_carlo(modelo="old", seed=seed)
+    with perfil.etapa("grafico"):
+        visualiza_distribuicoes(metricas_old)
 
     print("\n------------- Monte Carlo: NEW Model ---------------")
-    new_mc = MonteCarloAvaliador()
-    metricas_new = new_mc.monte_carlo(modelo="new")
-    visualiza_distribuicoes(metricas_new)
+    new_mc = MonteCarloAvaliador(cache_resultados=cache)
+    metricas_new = new_mc.monte_carlo(modelo="new", seed=seed)
+    with perfil.etapa("grafico"):
+        visualiza_distribuicoes(metricas_new)
+
+    perfil.mostra_relatorio()
+    perfil.salva_relatorio(
+        metricas={
+            modelo: {nome: float(np.nanmean(valores)) for nome, valores in m.items()}
+            for modelo, m in (("old", metricas_old), ("new", metricas_new))
+        }
+    )
@@ -0,0 +1,137 @@
+import json
+import mmap
+import os
+import sys
+import numpy as np
+
+from os.path import isfile, join
+
+# Pasta empacotada: arquivos pacote_00000.jsonl, ... com um registro (o conteúdo
+# JSON de um arquivo, compactado em uma linha) por linha e um índice com a
+# posição de cada registro
+INDICE_PACOTE = "indice_pacote.npz"
+REGISTROS_POR_PACOTE = 100_000
+
+# Pacotes já abertos neste processo: caminho -> (mtime do índice, Pacote)
+_abertos = {}
+
+
+def eh_pacote(path):
+    return isfile(join(path, INDICE_PACOTE))
+
+
+def nome_pacote(i):
+    return f"pacote_{i:05d}.jsonl"
+
+
+def empacota_pasta(path, destino, registros_por_pacote=REGISTROS_POR_PACOTE):
+    # Converte uma pasta de anotações ou de saídas em pacotes JSONL e índice.
+    # Tamanho e mtime de cada arquivo original vão para o índice, para que o
+    # cache de dados.carrega_pasta continue valendo por arquivo.
+    with os.scandir(path) as entradas:
+        arquivos = sorted(
+            (entrada.name, entrada.stat()) for entrada in entradas if entrada.is_file()
+        )
+    nomes = np.array([nome for nome, _ in arquivos], dtype=str)
+    tamanhos = np.array([st.st_size for _, st in arquivos], dtype=np.int64)
+    mtimes = np.array([st.st_mtime_ns for _, st in arquivos], dtype=np.int64)
+    os.makedirs(destino, exist_ok=True)
+    pacotes = np.arange(len(nomes), dtype=np.int32) // registros_por_pacote
+    inicios = np.zeros(len(nomes), dtype=np.int64)
+    comprimentos = np.zeros(len(nomes), dtype=np.int64)
+
+    arquivo = None
+    for i, nome in enumerate(nomes):
+        if i % registros_por_pacote == 0:
+            if arquivo:
+                arquivo.close()
+            arquivo = open(join(destino, nome_pacote(pacotes[i])), "wb")
+        with open(join(path, nome), "rb") as file:
+            registro = json.dumps(
+                json.loads(file.read()), separators=(",", ":"), ensure_ascii=False
+            ).encode()
+        inicios[i] = arquivo.tell()
+        comprimentos[i] = len(registro)
+        arquivo.write(registro + b"\n")
+    if arquivo:
+        arquivo.close()
+
+    # Índice gravado por último: uma pasta sem índice não é tratada como pacote
+    with open(join(destino, INDICE_PACOTE), "wb") as file:
+        np.savez(
+            file,
+            nomes=nomes,
+            tamanhos=tamanhos,
+            mtimes=mtimes,
+            pacotes=pacotes,
+            inicios=inicios,
+            comprimentos=comprimentos,
+        )
+    return destino
+
+
+class Pacote:
+    # Leitura de registros de uma pasta empacotada por posição ou nome de arquivo,
+    # em O(1), direto dos pacotes mapeados em memória (sem extrair arquivos)
+    def __init__(self, path):
+        self.path = path
+        with np.load(join(path, INDICE_PACOTE)) as indice:
+            self.nomes = indice["nomes"]
+            self.tamanhos = indice["tamanhos"]
+            self.mtimes = indice["mtimes"]
+            self.pacotes = indice["pacotes"]
+            self.inicios = indice["inicios"]
+            self.comprimentos = indice["comprimentos"]
+        self._mapas = {}
+        self._linhas = None
+
+    def __len__(self):
+        return len(self.nomes)
+
+    def listagem(self):
+        # Mesmo formato de pareamento.lista_pasta (nomes dos arquivos originais)
+        return self.nomes, self.tamanhos, self.mtimes
+
+    def mapa(self, pacote):
+        if pacote not in self._mapas:
+            with open(join(self.path, nome_pacote(pacote)), "rb") as file:
+                self._mapas[pacote] = mmap.mmap(
+                    file.fileno(), 0, access=mmap.ACCESS_READ
+                )
+        return self._mapas[pacote]
+
+    def registro(self, i):
+        # Conteúdo (bytes) do i-ésimo arquivo da listagem
+        inicio = int(self.inicios[i])
+        return self.mapa(int(self.pacotes[i]))[
+            inicio : inicio + int(self.comprimentos[i])
+        ]
+
+    def registro_arquivo(self, nome):
+        if self._linhas is None:
+            self._linhas = {str(n): i for i, n in enumerate(self.nomes)}
+        return self.registro(self._linhas[nome])
+
+    def fecha(self):
+        for mapa in self._mapas.values():
+            mapa.close()
+        self._mapas = {}
+
+
+def abre_pacote(path):
+    # Pacote da pasta, reaberto apenas se o índice mudou
+    chave = os.path.abspath(path)
+    mtime = os.stat(join(path, INDICE_PACOTE)).st_mtime_ns
+    aberto = _abertos.get(chave)
+    if aberto is None or aberto[0] != mtime:
+        if aberto is not None:
+            aberto[1].fecha()
+        aberto = _abertos[chave] = (mtime, Pacote(path))
+    return aberto[1]
+
+
+if __name__ == "__main__":
+    # python pacotes.py <pasta> <destino> [registros por pacote]
+    registros = int(sys.argv[3]) if len(sys.argv) > 3 else REGISTROS_POR_PACOTE
+    destino = empacota_pasta(sys.argv[1], sys.argv[2], registros)
+    print(f"{len(Pacote(destino))} arquivos empacotados em {destino}")
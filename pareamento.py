@@ -0,0 +1,199 @@
+import hashlib
+import os
+import zipfile
+import numpy as np
+
+from os.path import isfile, join, splitext
+
+from pacotes import abre_pacote, eh_pacote
+
+
+def lista_pasta(path):
+    # Nomes (ordenados), tamanhos e mtimes dos arquivos de uma pasta. Em uma
+    # pasta empacotada (pacotes.py), os dos arquivos originais.
+    if eh_pacote(path):
+        return abre_pacote(path).listagem()
+    arquivos = []
+    with os.scandir(path) as entradas:
+        for entrada in entradas:
+            if entrada.is_file():
+                st = entrada.stat()
+                arquivos.append((entrada.name, st.st_size, st.st_mtime_ns))
+    arquivos.sort()
+    nomes = np.array([a[0] for a in arquivos], dtype=str)
+    tamanhos = np.array([a[1] for a in arquivos], dtype=np.int64)
+    mtimes = np.array([a[2] for a in arquivos], dtype=np.int64)
+    return nomes, tamanhos, mtimes
+
+
+def nomes_base(nomes):
+    return np.array([splitext(nome)[0] for nome in nomes], dtype=str)
+
+
+class IndicePares:
+    # Índice nome base -> (arquivo de anotação, arquivo de saída, tamanho e mtime
+    # de cada um). Os pares são formados pelo nome base, nunca pela posição em
+    # duas listas ordenadas, e os arquivos sem par ficam registrados.
+    def __init__(self, anotacao_path, model_path, indice_path=None):
+        self.anotacao_path = anotacao_path
+        self.model_path = model_path
+        self.indice_path = indice_path
+        # Listagens (nomes, tamanhos, mtimes) de cada pasta
+        self.listagem_an = None
+        self.listagem_ot = None
+        # Posições dos pares nas listagens, em ordem de nome base
+        self.bases = np.array([], dtype=str)
+        self.linhas_an = np.array([], dtype=np.intp)
+        self.linhas_ot = np.array([], dtype=np.intp)
+        self.sem_saida = []  # Anotações sem saída do modelo
+        self.sem_anotacao = []  # Saídas do modelo sem anotação
+        self.duplicados = []  # Arquivos ignorados por repetirem um nome base
+        self.avisado = False  # Arquivos sem par já mostrados neste processo
+        if indice_path and isfile(indice_path):
+            self.carrega()
+
+    def atualiza(self):
+        # Relista as pastas e refaz os pares apenas se algum nome mudou.
+        # Devolve True se os pares mudaram.
+        listagem_an = lista_pasta(self.anotacao_path)
+        listagem_ot = lista_pasta(self.model_path)
+        mesmos_nomes = (
+            self.listagem_an is not None
+            and np.array_equal(self.listagem_an[0], listagem_an[0])
+            and np.array_equal(self.listagem_ot[0], listagem_ot[0])
+        )
+        mesmas_chaves = mesmos_nomes and all(
+            np.array_equal(anterior, atual)
+            for anterior, atual in zip(
+                self.listagem_an[1:] + self.listagem_ot[1:],
+                listagem_an[1:] + listagem_ot[1:],
+            )
+        )
+        self.listagem_an = listagem_an
+        self.listagem_ot = listagem_ot
+        if not mesmos_nomes:
+            self.pareia()
+        if self.indice_path and not mesmas_chaves:
+            self.salva()
+        return not mesmos_nomes
+
+    def pareia(self):
+        self.duplicados = []
+        self.avisado = False
+        bases_an, unicos_an = self.bases_unicas(self.listagem_an[0])
+        bases_ot, unicos_ot = self.bases_unicas(self.listagem_ot[0])
+
+        self.bases, i_an, i_ot = np.intersect1d(
+            bases_an, bases_ot, assume_unique=True, return_indices=True
+        )
+        self.linhas_an = unicos_an[i_an]
+        self.linhas_ot = unicos_ot[i_ot]
+
+        sem_par_an = np.ones(len(bases_an), dtype=bool)
+        sem_par_an[i_an] = False
+        sem_par_ot = np.ones(len(bases_ot), dtype=bool)
+        sem_par_ot[i_ot] = False
+        self.sem_saida = [str(n) for n in self.listagem_an[0][unicos_an[sem_par_an]]]
+        self.sem_anotacao = [str(n) for n in self.listagem_ot[0][unicos_ot[sem_par_ot]]]
+
+    def bases_unicas(self, nomes):
+        # Nomes base distintos e a posição do primeiro arquivo de cada um
+        bases, unicos = np.unique(nomes_base(nomes), return_index=True)
+        repetidos = np.ones(len(nomes), dtype=bool)
+        repetidos[unicos] = False
+        self.duplicados += [str(n) for n in nomes[repetidos]]
+        return bases, unicos
+
+    def arquivos(self):
+        # Listas alinhadas (anotações, saídas) no formato de obtem_dados
+        return (
+            [str(n) for n in self.listagem_an[0][self.linhas_an]],
+            [str(n) for n in self.listagem_ot[0][self.linhas_ot]],
+        )
+
+    def pares(self):
+        # Nome base -> (caminho anotação, caminho saída, tamanho e mtime de cada um)
+        nomes_an, tamanhos_an, mtimes_an = self.listagem_an
+        nomes_ot, tamanhos_ot, mtimes_ot = self.listagem_ot
+        return {
+            str(base): (
+                join(self.anotacao_path, str(nomes_an[a])),
+                join(self.model_path, str(nomes_ot[o])),
+                int(tamanhos_an[a]),
+                int(mtimes_an[a]),
+                int(tamanhos_ot[o]),
+                int(mtimes_ot[o]),
+            )
+            for base, a, o in zip(self.bases, self.linhas_an, self.linhas_ot)
+        }
+
+    def mostra_sem_par(self, limite=10):
+        # Até limite nomes de cada tipo; o restante só é contado
+        for nomes, mensagem in (
+            (self.sem_saida, "Anotação sem saída do modelo"),
+            (self.sem_anotacao, "Saída do modelo sem anotação"),
+            (self.duplicados, "Arquivo com nome base repetido ignorado"),
+        ):
+            for nome in nomes[:limite]:
+                print(f"AVISO: {mensagem}: {nome}")
+            if len(nomes) > limite:
+                print(f"AVISO: ... e mais {len(nomes) - limite} ({mensagem.lower()})")
+        self.avisado = True
+
+    def salva(self):
+        # Gravado ao lado e trocado de uma vez: um índice interrompido no meio da
+        # gravação nunca fica no lugar do anterior
+        with open(self.indice_path + ".tmp", "wb") as file:
+            np.savez(
+                file,
+                anotacao_path=os.path.abspath(self.anotacao_path),
+                model_path=os.path.abspath(self.model_path),
+                nomes_an=self.listagem_an[0],
+                tamanhos_an=self.listagem_an[1],
+                mtimes_an=self.listagem_an[2],
+                nomes_ot=self.listagem_ot[0],
+                tamanhos_ot=self.listagem_ot[1],
+                mtimes_ot=self.listagem_ot[2],
+                bases=self.bases,
+                linhas_an=self.linhas_an,
+                linhas_ot=self.linhas_ot,
+                sem_saida=np.array(self.sem_saida, dtype=str),
+                sem_anotacao=np.array(self.sem_anotacao, dtype=str),
+                duplicados=np.array(self.duplicados, dtype=str),
+            )
+        os.replace(self.indice_path + ".tmp", self.indice_path)
+
+    def carrega(self):
+        # Índice ilegível (por exemplo, truncado) é ignorado e refeito
+        try:
+            with np.load(self.indice_path) as indice:
+                # Índice de outro par de pastas é ignorado
+                if str(indice["anotacao_path"]) != os.path.abspath(
+                    self.anotacao_path
+                ) or str(indice["model_path"]) != os.path.abspath(self.model_path):
+                    return
+                self.listagem_an = tuple(
+                    indice[c] for c in ("nomes_an", "tamanhos_an", "mtimes_an")
+                )
+                self.listagem_ot = tuple(
+                    indice[c] for c in ("nomes_ot", "tamanhos_ot", "mtimes_ot")
+                )
+                self.bases = indice["bases"]
+                self.linhas_an = indice["linhas_an"]
+                self.linhas_ot = indice["linhas_ot"]
+                self.sem_saida = [str(n) for n in indice["sem_saida"]]
+                self.sem_anotacao = [str(n) for n in indice["sem_anotacao"]]
+                self.duplicados = [str(n) for n in indice["duplicados"]]
+        except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+            self.listagem_an = None
+            self.listagem_ot = None
+            self.bases = np.array([], dtype=str)
+            self.linhas_an = np.array([], dtype=np.intp)
+            self.linhas_ot = np.array([], dtype=np.intp)
+
+
+def caminho_indice(anotacao_path, model_path, cache_dir):
+    chave = hashlib.sha1(
+        (os.path.abspath(anotacao_path) + "\0" + os.path.abspath(model_path)).encode()
+    ).hexdigest()[:16]
+    return join(cache_dir, f"pares_{chave}.npz")
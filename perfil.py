@@ -0,0 +1,129 @@
+import contextlib
+import json
+import os
+import platform
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Perfil de execução por etapa (pareamento, io, parse, score, agregacao,
+# bootstrap, grafico) e contadores (arquivos, bytes, entidades, dentes).
+# Desligado por padrão: etapa() devolve um contexto vazio e conta() retorna
+# logo. Liga com AVALIADOR_PERFIL=1, --perfil nos scripts ou ativa().
+ativo = os.environ.get("AVALIADOR_PERFIL", "") not in ("", "0")
+RELATORIO = os.environ.get("AVALIADOR_PERFIL_RELATORIO", "perfil_avaliacao.json")
+
+_etapas = {}  # nome -> [chamadas, segundos de parede, segundos de CPU]
+_contadores = {}
+_trava = threading.Lock()  # Etapas e contadores também são usados pelas threads
+_nulo = contextlib.nullcontext()
+_inicio = time.time()
+
+
+def ativa(valor=True):
+    global ativo
+    ativo = valor
+
+
+def ativa_pela_linha_de_comando(argv=None):
+    if "--perfil" in (sys.argv if argv is None else argv):
+        ativa()
+
+
+def reinicia():
+    global _inicio
+    with _trava:
+        _etapas.clear()
+        _contadores.clear()
+    _inicio = time.time()
+
+
+class _Etapa:
+    # Tempos inclusivos: uma etapa dentro de outra conta nas duas. O tempo de CPU
+    # é o da thread que executa a etapa (processos filhos não entram).
+    __slots__ = ("nome", "parede", "cpu")
+
+    def __init__(self, nome):
+        self.nome = nome
+
+    def __enter__(self):
+        self.parede = time.perf_counter()
+        self.cpu = time.thread_time()
+
+    def __exit__(self, *excecao):
+        parede = time.perf_counter() - self.parede
+        cpu = time.thread_time() - self.cpu
+        with _trava:
+            valores = _etapas.setdefault(self.nome, [0, 0.0, 0.0])
+            valores[0] += 1
+            valores[1] += parede
+            valores[2] += cpu
+
+
+def etapa(nome):
+    return _Etapa(nome) if ativo else _nulo
+
+
+def conta(nome, valor=1):
+    if ativo:
+        with _trava:
+            _contadores[nome] = _contadores.get(nome, 0) + valor
+
+
+def pico_rss_mb():
+    # Maior memória residente do processo até agora (None sem o módulo resource)
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss é em bytes no macOS e em KB nos demais
+    return pico / 2**20 if sys.platform == "darwin" else pico / 2**10
+
+
+def relatorio(**extras):
+    with _trava:
+        etapas = {
+            nome: {"chamadas": chamadas, "parede_s": parede, "cpu_s": cpu}
+            for nome, (chamadas, parede, cpu) in _etapas.items()
+        }
+        contadores = dict(_contadores)
+    return {
+        "inicio": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(_inicio)),
+        "duracao_s": time.time() - _inicio,
+        "comando": sys.argv,
+        "python": platform.python_version(),
+        "etapas": etapas,
+        "contadores": contadores,
+        "pico_rss_mb": pico_rss_mb(),
+        **extras,
+    }
+
+
+def salva_relatorio(path=None, **extras):
+    # Grava o relatório em JSON se o perfil estiver ligado; extras (ex.: as
+    # métricas calculadas) entram no mesmo arquivo. Devolve o caminho ou None.
+    if not ativo:
+        return None
+    path = path or RELATORIO
+    with open(path, "w") as file:
+        json.dump(relatorio(**extras), file, indent=4, default=float)
+    return path
+
+
+def mostra_relatorio():
+    if not ativo:
+        return
+    dados = relatorio()
+    for nome, valores in dados["etapas"].items():
+        print(
+            f"{nome:<12} {valores['parede_s']:9.3f}s parede {valores['cpu_s']:9.3f}s "
+            f"CPU ({valores['chamadas']} chamadas)"
+        )
+    for nome, valor in dados["contadores"].items():
+        print(f"{nome:<12} {valor}")
+    if dados["pico_rss_mb"] is not None:
+        print(f"Pico de RSS: {dados['pico_rss_mb']:.1f} MB")
@@ -0,0 +1,116 @@
+import os
+import time
+import numpy as np
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import dados
+import perfil
+
+from dados import CAMPOS_PASTA, DENTES, extrai_anotacao, extrai_saida
+
+
+def le_bytes(caminho, latencia=0.0):
+    # latencia simula um armazenamento lento ou em rede (segundos por arquivo)
+    with perfil.etapa("io"):
+        if latencia:
+            time.sleep(latencia)
+        with open(caminho, "rb") as file:
+            conteudo = file.read()
+    perfil.conta("arquivos")
+    perfil.conta("bytes", len(conteudo))
+    return conteudo
+
+
+def extrai_bytes(conteudo, tipo):
+    # Linhas de um arquivo, na ordem de CAMPOS_PASTA[tipo]
+    # Nos processos do pool o perfil não é coletado (estado por processo)
+    with perfil.etapa("parse"):
+        linhas = [
+            np.full((len(DENTES), *forma), vazio, dtype=dtype)
+            for _, dtype, vazio, forma in CAMPOS_PASTA[tipo]
+        ]
+        dado = dados.leitor_json(conteudo)
+        if tipo == "anotacao":
+            extrai_anotacao(dado, *linhas)
+        else:
+            extrai_saida(dado, *linhas)
+    return linhas
+
+
+def extrai_lote(conteudos, tipo):
+    # Executado nos processos: um lote por tarefa para diluir o custo de IPC
+    return [extrai_bytes(conteudo, tipo) for conteudo in conteudos]
+
+
+def le_em_pipeline(
+    caminhos, tipo, leitores=8, processos=0, em_voo=64, lote=16, latencia=0.0
+):
+    # Lê os arquivos com um pool de threads, extrai os campos (em um pool de
+    # processos se processos > 0, senão nas próprias threads) e devolve as linhas
+    # de cada arquivo na ordem de caminhos. No máximo em_voo arquivos ficam lidos
+    # e ainda não consumidos, o que limita a memória usada.
+    processos = processos if processos is not None else os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=leitores) as threads:
+        pool = ProcessPoolExecutor(max_workers=processos) if processos else None
+        try:
+            proximos = iter(caminhos)
+            leituras = deque()  # Futuros de leitura (bytes ou linhas), em ordem
+            extracoes = deque()  # Futuros de extração de lotes, em ordem
+            pendentes = []  # Bytes lidos aguardando formar um lote
+            esgotado = False
+
+            def em_andamento():
+                return len(leituras) + len(pendentes) + lote * len(extracoes)
+
+            while True:
+                # Mantém o pipeline cheio até o limite de arquivos em voo
+                while not esgotado and em_andamento() < em_voo:
+                    caminho = next(proximos, None)
+                    if caminho is None:
+                        esgotado = True
+                    elif pool:
+                        leituras.append(threads.submit(le_bytes, caminho, latencia))
+                    else:
+                        leituras.append(
+                            threads.submit(
+                                lambda c: extrai_bytes(le_bytes(c, latencia), tipo),
+                                caminho,
+                            )
+                        )
+
+                if not pool:
+                    if not leituras:
+                        return
+                    yield leituras.popleft().result()
+                    continue
+
+                # Leituras concluídas (na ordem) formam lotes para os processos
+                while leituras and (leituras[0].done() or not extracoes):
+                    pendentes.append(leituras.popleft().result())
+                    if len(pendentes) == lote:
+                        extracoes.append(pool.submit(extrai_lote, pendentes, tipo))
+                        pendentes = []
+                # Lote incompleto segue quando não há mais leituras a esperar
+                if pendentes and not leituras:
+                    extracoes.append(pool.submit(extrai_lote, pendentes, tipo))
+                    pendentes = []
+
+                if extracoes:
+                    yield from extracoes.popleft().result()
+                elif not leituras and not pendentes:
+                    return
+        finally:
+            if pool:
+                pool.shutdown(cancel_futures=True)
+
+
+def leitor_pipeline(leitores=8, processos=0, em_voo=64, lote=16, latencia=0.0):
+    # Leitor para dados.carrega_pasta / dados.carrega_dados
+    def leitor(caminhos, tipo):
+        return le_em_pipeline(
+            caminhos, tipo, leitores, processos, em_voo, lote, latencia
+        )
+
+    return leitor
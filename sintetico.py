@@ -0,0 +1,162 @@
+import json
+import os
+import sys
+import numpy as np
+
+from os.path import join
+
+from dados import DENTES, LIMIAR_SCORE
+
+# Distribuições de score: nome -> função (rng, parâmetros, n) -> n scores em [0, 1]
+DISTRIBUICOES_SCORE = {
+    "beta": lambda rng, a, b, n: rng.beta(a, b, n),
+    "uniforme": lambda rng, minimo, maximo, n: rng.uniform(minimo, maximo, n),
+    "normal": lambda rng, media, desvio, n: np.clip(rng.normal(media, desvio, n), 0, 1),
+}
+
+# Modelos gerados: pasta de saída e se todos os 32 dentes aparecem na saída
+# (o modelo antigo devolve todos, com score ~0 para os ausentes)
+MODELOS_SINTETICOS = {
+    "old": ("output_longaxis_old", True),
+    "new": ("output_longaxis_standard", False),
+}
+
+LARGURA = 2898
+ALTURA = 1504
+
+
+def sorteia_scores(rng, distribuicao, n):
+    nome, *parametros = distribuicao
+    return DISTRIBUICOES_SCORE[nome](rng, *parametros, n)
+
+
+def nomes_sinteticos(rng, n_imagens, n_clinicas):
+    # Nomes no formato <hostname da clínica>_<paciente>_<exame>, com poucas
+    # clínicas concentrando a maior parte das imagens, como nos dados reais
+    pesos = 1.0 / np.arange(1, n_clinicas + 1)
+    clinica = rng.choice(n_clinicas, n_imagens, p=pesos / pesos.sum())
+    pacientes = rng.choice(10**6, n_imagens, replace=False)
+    return [
+        f"clinica{c:03d}.sintetico.com.br_{p}_{i}"
+        for i, (c, p) in enumerate(zip(clinica, pacientes))
+    ]
+
+
+def eixos_sinteticos(rng, n_imagens, ruido):
+    # Longo eixo (n_imagens, 32, 2, 2) de cada dente ao longo da arcada:
+    # quadrantes 1 e 2 em cima, 3 e 4 embaixo, do 8 de um lado ao 8 do outro
+    quadrante = np.array([int(d[0]) for d in DENTES])
+    posicao = np.array([int(d[1]) for d in DENTES])
+    lado = np.where(np.isin(quadrante, (1, 4)), -1, 1)
+    x = LARGURA / 2 + lado * (posicao - 0.5) * LARGURA / 18
+    superior = np.isin(quadrante, (1, 2))
+    y_colo = np.where(superior, ALTURA * 0.6, ALTURA * 0.65)
+    y_raiz = np.where(superior, ALTURA * 0.42, ALTURA * 0.83)
+    base = np.stack(
+        [np.stack([x, y_colo], axis=1), np.stack([x - lado * 20, y_raiz], axis=1)],
+        axis=1,
+    )
+    return base + rng.normal(0, ruido, (n_imagens, len(DENTES), 2, 2))
+
+
+def anotacao_sintetica(presentes, eixos):
+    return [
+        {
+            "type": 0,
+            "label": DENTES[i],
+            "state": 0,
+            "marked": False,
+            "labels": "Dentes",
+            "dente": -1,
+            "pts": [{"x": x, "y": y} for x, y in eixos[i].tolist()],
+        }
+        for i in np.flatnonzero(presentes)
+    ]
+
+
+def saida_sintetica(incluidos, scores, eixos):
+    return {
+        "model_name": "longaxis",
+        "output_width": LARGURA,
+        "output_height": ALTURA,
+        "image_hash": None,
+        "entities": [
+            {
+                "class_name": DENTES[i],
+                "score": float(scores[i]),
+                "model_name": "longaxis",
+                "tooth": None,
+                "point": None,
+                "line": eixos[i].tolist(),
+                "bbox": None,
+                "contour": None,
+                "heatmap": None,
+            }
+            for i in np.flatnonzero(incluidos)
+        ],
+    }
+
+
+def gera_dataset(
+    destino,
+    n_imagens=1000,
+    taxa_ausencia=0.16,
+    distribuicao_score=("beta", 8, 5),
+    taxa_falsos_positivos=0.01,
+    taxa_falsos_negativos=0.01,
+    n_clinicas=70,
+    modelos=("old", "new"),
+    seed=0,
+):
+    # Escreve em destino/anotacao/ e destino/<pasta de cada modelo>/ arquivos nos
+    # mesmos formatos de test/. taxa_ausencia: proporção de dentes ausentes na
+    # anotação. Os scores dos dentes detectados seguem distribuicao_score
+    # (("beta", a, b), ("uniforme", min, max) ou ("normal", média, desvio)); os não
+    # detectados recebem score abaixo de LIMIAR_SCORE. Devolve os caminhos das pastas.
+    rng = np.random.default_rng(seed)
+    nomes = nomes_sinteticos(rng, n_imagens, n_clinicas)
+    forma = (n_imagens, len(DENTES))
+    presentes = rng.random(forma) >= taxa_ausencia
+    eixos_anotacao = eixos_sinteticos(rng, n_imagens, ruido=15.0)
+
+    caminhos = {"anotacao": join(destino, "anotacao")}
+    os.makedirs(caminhos["anotacao"], exist_ok=True)
+    for nome, presentes_i, eixos_i in zip(nomes, presentes, eixos_anotacao):
+        with open(join(caminhos["anotacao"], f"{nome}.json"), "w") as file:
+            json.dump(anotacao_sintetica(presentes_i, eixos_i), file, indent=4)
+
+    for modelo in modelos:
+        pasta, todos = MODELOS_SINTETICOS[modelo]
+        caminhos[modelo] = join(destino, pasta)
+        os.makedirs(caminhos[modelo], exist_ok=True)
+        erro = np.where(presentes, taxa_falsos_negativos, taxa_falsos_positivos)
+        detectados = presentes ^ (rng.random(forma) < erro)
+        scores = np.where(
+            detectados,
+            sorteia_scores(rng, distribuicao_score, detectados.size).reshape(forma),
+            rng.uniform(0, 0.05, forma),
+        )
+        # O limiar do modelo antigo separa detectados de não detectados
+        scores = np.where(
+            detectados, np.maximum(scores, np.nextafter(LIMIAR_SCORE, 1)), scores
+        )
+        incluidos = np.ones(forma, dtype=bool) if todos else detectados
+        eixos_modelo = eixos_anotacao + rng.normal(0, 8.0, eixos_anotacao.shape)
+        for nome, incluidos_i, scores_i, eixos_i in zip(
+            nomes, incluidos, scores, eixos_modelo
+        ):
+            with open(join(caminhos[modelo], f"{nome}.txt"), "w") as file:
+                json.dump(
+                    saida_sintetica(incluidos_i, scores_i, eixos_i),
+                    file,
+                    separators=(",", ":"),
+                )
+    return caminhos
+
+
+if __name__ == "__main__":
+    # python sintetico.py <destino> [n_imagens]
+    destino = sys.argv[1] if len(sys.argv) > 1 else "sintetico/"
+    n_imagens = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    for nome, caminho in gera_dataset(destino, n_imagens).items():
+        print(f"{nome}: {caminho}")
@@ -0,0 +1,106 @@
+import numpy as np
+
+import dados
+
+from conta_dentes import Avaliador
+from fragmentos import avalia_fragmento, avaliadores, combina, monte_carlo_parcial
+from monte_carlo import MonteCarloAvaliador, soma_amostras_paralelo
+from pipeline import leitor_pipeline
+
+# Garantias de equivalência verificadas nas pastas de test/
+ANOTACAO_PATH = "test/anotacao/"
+OLD_MODEL_PATH = "test/output_longaxis_old/"
+NEW_MODEL_PATH = "test/output_longaxis_standard/"
+
+
+def test_soma_amostras_identica_com_qualquer_numero_de_processos():
+    contagens = np.random.default_rng(0).integers(0, 32, (500, 5)).astype(np.uint8)
+    # Mais de um bloco de iterações, para que os processos dividam o trabalho
+    sequencial = soma_amostras_paralelo(contagens, 350, 2500, seed=7, processos=1)
+    for processos in (2, 3):
+        paralelo = soma_amostras_paralelo(
+            contagens, 350, 2500, seed=7, processos=processos
+        )
+        assert np.array_equal(sequencial, paralelo)
+
+
+def test_monte_carlo_identico_com_qualquer_numero_de_processos():
+    resultados = []
+    for processos in (1, 2):
+        avaliador = MonteCarloAvaliador(num_iteracoes=2100, processos=processos)
+        avaliador.anotacao_path = ANOTACAO_PATH
+        resultados.append(avaliador.monte_carlo("old", seed=3))
+    assert resultados[0] == resultados[1]
+
+
+def carrega_sem_cache(model_path, leitor=None):
+    # Leitura completa das pastas, sem o cache em disco nem o deste processo
+    dados._pastas.clear()
+    dados._carregados.clear()
+    return dados.carrega_dados(ANOTACAO_PATH, model_path, cache_dir=None, leitor=leitor)
+
+
+def test_pipeline_identico_a_leitura_sequencial():
+    for model_path in (OLD_MODEL_PATH, NEW_MODEL_PATH):
+        sequencial = carrega_sem_cache(model_path)
+        # Armazenamento lento simulado (1 ms por arquivo), com extração nas
+        # threads e em processos
+        for processos in (0, 2):
+            leitor = leitor_pipeline(8, processos, em_voo=32, latencia=0.001)
+            lido = carrega_sem_cache(model_path, leitor)
+            assert lido.nomes == sequencial.nomes
+            for campo in (
+                "anotacao",
+                "presenca",
+                "score",
+                "eixo_anotacao",
+                "eixo_modelo",
+            ):
+                assert np.array_equal(
+                    getattr(lido, campo), getattr(sequencial, campo), equal_nan=True
+                )
+
+
+def test_fragmentos_combinados_iguais_a_avaliacao_unica():
+    for model_path, modelo in ((OLD_MODEL_PATH, "old"), (NEW_MODEL_PATH, "new")):
+        unico = avalia_fragmento(ANOTACAO_PATH, model_path, modelo)
+        # Ordem de combinação diferente da ordem dos fragmentos
+        parciais = [
+            avalia_fragmento(ANOTACAO_PATH, model_path, modelo, fragmento=(i, 3))
+            for i in (2, 0, 1)
+        ]
+        combinado = combina(*parciais)
+        assert np.array_equal(combinado.nomes, unico.nomes)
+        assert np.array_equal(combinado.contagens, unico.contagens)
+        assert np.array_equal(combinado.totais, unico.totais)
+        assert np.array_equal(combinado.histograma, unico.histograma)
+
+        geral, por_dente = avaliadores(combinado)
+        avaliador = Avaliador()
+        avaliador.anotacao_path = ANOTACAO_PATH
+        avaliador.acumula(
+            dados.contagens_regra(
+                dados.carrega_dados(ANOTACAO_PATH, model_path), modelo
+            ),
+            len(unico),
+        )
+        assert geral.calcula_metricas() == avaliador.calcula_metricas()
+
+        monte_carlo = MonteCarloAvaliador(num_iteracoes=300)
+        monte_carlo.anotacao_path = ANOTACAO_PATH
+        assert monte_carlo_parcial(combinado, 300, seed=5) == monte_carlo.monte_carlo(
+            modelo, seed=5
+        )
+
+
+def test_monte_carlo_adaptativo_identico_com_qualquer_numero_de_processos():
+    resultados = []
+    for processos in (1, 3):
+        avaliador = MonteCarloAvaliador(processos=processos)
+        avaliador.anotacao_path = ANOTACAO_PATH
+        resultados.append(
+            avaliador.monte_carlo_adaptativo(
+                "old", tolerancia=0.002, max_iteracoes=20_000, seed=4
+            )
+        )
+    assert resultados[0] == resultados[1]
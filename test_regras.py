@@ -0,0 +1,125 @@
+import numpy as np
+import pytest
+
+from bits import desempacota, empacota, popcount
+from dados import (
+    LIMIAR_SCORE,
+    REGRAS,
+    Regra,
+    carrega_dados,
+    contagens_regra,
+    matrizes_confusao,
+    regra,
+)
+from monte_carlo import MonteCarloAvaliador
+
+# Leitura das regras de avaliação, verificada nas pastas de test/
+ANOTACAO_PATH = "test/anotacao/"
+OLD_MODEL_PATH = "test/output_longaxis_old/"
+
+
+def test_nomes_e_objetos():
+    assert regra("old") is REGRAS["old"]
+    assert regra("new") is regra("presenca")
+    limiar_por_dente = Regra("score", ">=", {"11": 0.2})
+    assert regra(limiar_por_dente) is limiar_por_dente
+
+
+@pytest.mark.parametrize(
+    "texto, operador, limiar",
+    [
+        ("score > 0.3", ">", 0.3),
+        ("score>0.3", ">", 0.3),
+        ("  score >= 0.25 ", ">=", 0.25),
+        ("score ≥ 1e-1", ">=", 0.1),
+        ("score > -0.5", ">", -0.5),
+    ],
+)
+def test_texto(texto, operador, limiar):
+    lida = regra(texto)
+    assert lida == Regra("score", operador, limiar)
+    assert not lida.ignora_empate
+    assert np.all(lida.limiares == limiar)
+
+
+@pytest.mark.parametrize(
+    "texto", ["score < 0.3", "score > ", "score > abc", "presença", "old model", ""]
+)
+def test_texto_invalido(texto):
+    with pytest.raises(ValueError):
+        regra(texto)
+
+
+def test_repr_lido_de_volta():
+    for lida in (Regra("score", ">", 0.35), Regra("score", ">=", 0.2)):
+        assert regra(repr(lida)) == lida
+    # Regras diferentes têm descrições diferentes (chave dos caches)
+    assert repr(regra("score > 0.1")) != repr(REGRAS["old"])
+    assert repr(Regra("score", ">", {"11": 0.2})) != repr(Regra("score", ">", 0.2))
+    assert Regra("score", ">", {}) == Regra("score", ">", LIMIAR_SCORE)
+
+
+def test_contagens_regra_iguais_as_matrizes():
+    dados = carrega_dados(ANOTACAO_PATH, OLD_MODEL_PATH)
+    for modelo in ("old", "new", "score >= 0.5"):
+        confusao = matrizes_confusao(dados, modelo)
+        contagens = contagens_regra(dados, modelo, por_imagem_dente=True)
+        vp, fp, fn, vn = (
+            confusao[nome]
+            for nome in (
+                "verdadeiros_positivos",
+                "falsos_positivos",
+                "falsos_negativos",
+                "verdadeiros_negativos",
+            )
+        )
+        assert np.array_equal(
+            contagens["por_imagem"],
+            np.stack([(vp | vn).sum(1), vp.sum(1), fp.sum(1), fn.sum(1)], axis=1),
+        )
+        assert np.array_equal(
+            contagens["por_dente"], np.stack([m.sum(0) for m in (vp, fp, fn, vn)])
+        )
+        assert np.array_equal(
+            contagens["por_imagem_dente"], np.stack([vp | vn, vp, fp, fn], axis=2)
+        )
+
+
+def test_monte_carlo_exige_a_pasta_de_outras_regras():
+    avaliador = MonteCarloAvaliador(num_iteracoes=50)
+    avaliador.anotacao_path = ANOTACAO_PATH
+    with pytest.raises(ValueError):
+        avaliador.monte_carlo("score > 0.3", seed=0)
+    with pytest.raises(ValueError):
+        avaliador.monte_carlo_por_dente(REGRAS["old"], seed=0)
+    assert avaliador.monte_carlo(
+        (OLD_MODEL_PATH, REGRAS["old"]), seed=0
+    ) == avaliador.monte_carlo("old", seed=0)
+
+
+def test_bits_iguais_as_mascaras_bool():
+    mascara = np.random.default_rng(1).random((200, 32)) < 0.5
+    palavras = empacota(mascara)
+    assert palavras.dtype == np.uint32
+    assert np.array_equal(desempacota(palavras), mascara)
+    assert np.array_equal(popcount(palavras), mascara.sum(axis=1))
+
+    dados = carrega_dados(ANOTACAO_PATH, OLD_MODEL_PATH)
+    an = dados.anotacao
+    for modelo in ("old", "new"):
+        # Contagens por popcount contra as máscaras bool da regra
+        assert REGRAS[modelo].mascaras_bits(dados) is not None
+        positivo, negativo = REGRAS[modelo].mascaras(dados)
+        mascaras = [an & positivo, ~an & positivo, an & negativo, ~an & negativo]
+        contagens = contagens_regra(dados, modelo, confusao=True)
+        vp, fp, fn, vn = mascaras
+        assert np.array_equal(
+            contagens["por_imagem"],
+            np.stack([(vp | vn).sum(1), vp.sum(1), fp.sum(1), fn.sum(1)], axis=1),
+        )
+        assert np.array_equal(
+            contagens["por_dente"], np.stack([m.sum(0) for m in mascaras])
+        )
+        for m, nome in zip(mascaras, contagens["confusao"]):
+            assert np.array_equal(contagens["confusao"][nome], m)
+    assert Regra("score", ">=", LIMIAR_SCORE).mascaras_bits(dados) is None